@@ -1,9 +1,46 @@
 import streamlit as st
 import pandas as pd
-import akshare as ak
 import datetime
+import sys
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import uuid
+from types import MappingProxyType
+from export_api import EXPORT_HOST, EXPORT_PORT, SNAPSHOT_STALE_SECONDS, get_snapshot_store, start_export_server
+from market_data import (
+    ETF_CONFIG,
+    MAX_QUOTE_AGE,
+    MAX_SNAPSHOT_SKEW,
+    get_aligned_quotes,
+    get_etf_symbol_for_type,
+    get_option_chain_quotes,
+    get_option_quotes_batch,
+    get_real_time_etf_quotes,
+    is_standard_contract,
+    measure_age,
+    measure_skew
+)
+from premium_calc import (
+    calculate_atm_premium_grid,
+    calculate_implied_forwards,
+    calculate_premium_value,
+    calculate_time_value,
+    resolve_atm_strike,
+    select_atm_legs
+)
+from premium_history import append_tick, get_chart_dates, load_chart_data, load_daily_premiums, make_pair_key
+from session_store import (
+    is_valid_profile_id,
+    load_profile,
+    new_profile_id,
+    prune_profiles,
+    save_profile_text,
+    serialize_profile
+)
+from snapshot_bus import publish_subscription, read_merged_snapshot
+from trading_calendar import get_trading_calendar
+from reference_data import ReferenceData
+from upstream_client import get_upstream_client, warm_up
 
 # 页面配置
 st.set_page_config(
@@ -18,310 +55,295 @@ st.markdown("""
 选择两个行权价对应的Call和Put合约，查看4个合约的最新买一卖一价格。
 """)
 
-# 自动计算合约月份的函数（从原文件复用）
-def get_contract_months():
-    """根据第4个星期三规则自动计算合约月份"""
-    today = datetime.date.today()
-    
-    # 计算本月第4个星期三
-    first_day = datetime.date(today.year, today.month, 1)
-    # 计算第一个星期三
-    first_wednesday = first_day + datetime.timedelta(days=(2 - first_day.weekday()) % 7)
-    # 第四个星期三 = 第一个星期三 + 3周
-    fourth_wednesday = first_wednesday + datetime.timedelta(weeks=3)
-    
-    # 判断今天是否在本月第4个周三及之前
-    if today <= fourth_wednesday:
-        # 使用本月作为基准
-        base_month = today.month
-        base_year = today.year
-    else:
-        # 使用下月作为基准
-        if today.month == 12:
-            base_month = 1
-            base_year = today.year + 1
-        else:
-            base_month = today.month + 1
-            base_year = today.year
-    
-    # 计算4个合约月份
-    contract_months = []
-    
-    # 本月合约
-    current_month = f"{base_year % 100:02d}{base_month:02d}"
-    contract_months.append(current_month)
-    
-    # 下月合约
-    if base_month == 12:
-        next_month = 1
-        next_year = base_year + 1
-    else:
-        next_month = base_month + 1
-        next_year = base_year
-    next_month_contract = f"{next_year % 100:02d}{next_month:02d}"
-    contract_months.append(next_month_contract)
-    
-    # 本季合约（3、6、9、12月）
-    quarter_months = [3, 6, 9, 12]
-    current_quarter_month = None
-    current_quarter_year = base_year
-    
-    for qm in quarter_months:
-        if base_month <= qm:
-            current_quarter_month = qm
-            break
-    
-    if current_quarter_month is None:
-        current_quarter_month = 3
-        current_quarter_year = base_year + 1
-    
-    current_quarter_contract = f"{current_quarter_year % 100:02d}{current_quarter_month:02d}"
-    
-    # 检查本季合约是否与本月或下月合约重复
-    if current_quarter_contract in [current_month, next_month_contract]:
-        # 如果重复，将本季和下季合约都往后推一个季度
-        if current_quarter_month == 12:
-            current_quarter_month = 3
-            current_quarter_year += 1
-        else:
-            current_quarter_month = quarter_months[quarter_months.index(current_quarter_month) + 1]
-        
-        current_quarter_contract = f"{current_quarter_year % 100:02d}{current_quarter_month:02d}"
-    
-    contract_months.append(current_quarter_contract)
-    
-    # 下季合约
-    if current_quarter_month == 12:
-        next_quarter_month = 3
-        next_quarter_year = current_quarter_year + 1
-    else:
-        next_quarter_month = quarter_months[quarter_months.index(current_quarter_month) + 1]
-        next_quarter_year = current_quarter_year
-    
-    next_quarter_contract = f"{next_quarter_year % 100:02d}{next_quarter_month:02d}"
-    contract_months.append(next_quarter_contract)
-    
-    return contract_months
+# 走势图时间范围 -> 交易日数
+CHART_RANGES = {
+    "今日": 1,
+    "近5日": 5,
+    "近20日": 20,
+    "近60日": 60
+}
 
-# 建立期权代码映射关系（从原文件复用）
-@st.cache_data(ttl=43200)  # 缓存12小时
-def get_option_code_mapping():
-    """建立CONTRACT_ID到SECURITY_ID的映射关系"""
-    mapping = {}
-    
-    def get_previous_working_days(num_days=10):
-        """获取上一个工作日开始的日期列表，排除周六周日"""
-        dates = []
-        current_date = datetime.date.today()
-        
-        while len(dates) < num_days:
-            current_date -= datetime.timedelta(days=1)
-            # 跳过周六(5)和周日(6)
-            if current_date.weekday() < 5:  # 0-4是周一到周五
-                dates.append(current_date.strftime("%Y%m%d"))
-        
-        return dates
-    
+# ETF类型映射
+ETF_DISPLAY_NAMES = {
+    "华泰柏瑞沪深300ETF期权": "300ETF",
+    "南方中证500ETF期权": "500ETF", 
+    "华夏上证50ETF期权": "50ETF",
+    "华夏科创50ETF期权": "科创50ETF",
+    "易方达科创50ETF期权": "科创板50ETF"
+}
+
+# 会话登记表（进程级共享），用于统计每个会话的内存开销
+SESSION_IDLE_SECONDS = 1800
+
+@st.cache_resource
+def get_session_registry():
+    """记录各会话最近活动时间和会话状态大小"""
+    return {'lock': threading.Lock(), 'sessions': {}}
+
+# 全品种平值贴水在多少秒内由所有会话共用：一次约需41次上游调用，按上游限速约5秒，
+# 有效期取15秒，为各会话的组合报价留出额度
+ATM_GRID_TTL_SECONDS = 15
+# 获取平值合约报价的并发数不超过限速，排队在线程池中而不是在令牌桶上等待超时
+ATM_GRID_WORKERS = 8
+
+@st.cache_resource
+def get_atm_grid_cache():
+    """进程级共享的全品种平值贴水结果"""
+    return {'lock': threading.Lock(), 'computed_at': None, 'option_data': None, 'grid': None, 'refreshing': False}
+
+# 后台重新获取全品种平值贴水
+def refresh_atm_grid(cache, option_data, option_mapping):
+    """获取5个标的和约36个平值合约的报价，完成后替换共享结果"""
     try:
-        # 获取最近的工作日列表
-        working_dates = get_previous_working_days(10)  # 获取最近10个工作日
-        
-        option_risk_df = None
-        used_date = None
-        
-        # 尝试多个工作日期，找到一个有效的
-        for date in working_dates:
-            try:
-                option_risk_df = ak.option_risk_indicator_sse(date=date)
-                if not option_risk_df.empty:
-                    used_date = date
-                    break
-            except Exception as date_error:
-                continue
-        
-        if option_risk_df is None or option_risk_df.empty:
-            return {}
-        
-        # 检查是否有期望的列名
-        actual_columns = list(option_risk_df.columns)
-        required_columns = ['SECURITY_ID', 'CONTRACT_ID', 'CONTRACT_SYMBOL']
-        missing_columns = [col for col in required_columns if col not in actual_columns]
-        
-        if missing_columns:
-            return {}
-        
-        # 建立CONTRACT_ID到SECURITY_ID的映射
-        for _, row in option_risk_df.iterrows():
-            try:
-                contract_id = str(row['CONTRACT_ID'])
-                security_id = str(row['SECURITY_ID'])
-                contract_symbol = str(row['CONTRACT_SYMBOL'])
-                
-                # 建立映射关系
-                mapping[contract_id] = {
-                    'security_id': security_id,
-                    'contract_symbol': contract_symbol
-                }
-                
-            except Exception as row_error:
-                continue
-        
-        return mapping
-        
-    except Exception as e:
-        return {}
-
-# 获取基础期权数据（从原文件复用并修改）
-@st.cache_data(ttl=43200)
-def get_basic_option_data():
-    """获取基础期权数据，缓存12小时"""
-    etf_symbols = [
-        "华泰柏瑞沪深300ETF期权",      # 300ETF
-        "南方中证500ETF期权",          # 500ETF
-        "华夏上证50ETF期权",           # 50ETF
-        "华夏科创50ETF期权",           # 科创50ETF
-        "易方达科创50ETF期权"          # 科创板50ETF
-    ]
-    
-    # 自动获取合约月份
-    contract_months = get_contract_months()
-    
-    all_option_data = []
-    for symbol in etf_symbols:
-        for month in contract_months:
-            try:
-                option_data = ak.option_finance_board(symbol=symbol, end_month=month)
-                if not option_data.empty:
-                    option_data['ETF类型'] = symbol
-                    all_option_data.append(option_data)
-            except Exception as e:
-                st.warning(f"获取 {symbol} {month} 月合约失败: {str(e)}")
-                continue
-    
-    if not all_option_data:
-        return pd.DataFrame()
-    
-    option_finance_board_df = pd.concat(all_option_data)
-    # 从合约交易代码中提取月份信息
-    option_finance_board_df['合约月份'] = option_finance_board_df['合约交易代码'].str[7:11]
-    
-    return option_finance_board_df
+        etf_quotes = get_real_time_etf_quotes()
+        etf_prices = {symbol: quote.get('price', 0.0) for symbol, quote in etf_quotes.items()}
+        atm_legs = select_atm_legs(option_data, option_mapping, etf_prices)
+        atm_security_ids = [] if atm_legs.empty else [
+            security_id
+            for security_id in atm_legs[['call_security_id', 'put_security_id']].to_numpy().ravel()
+            if security_id
+        ]
+        grid = calculate_atm_premium_grid(
+            atm_legs, get_option_quotes_batch(atm_security_ids, max_workers=ATM_GRID_WORKERS), etf_quotes
+        )
+        with cache['lock']:
+            cache.update(computed_at=time.time(), option_data=option_data, grid=grid)
+    finally:
+        with cache['lock']:
+            cache['refreshing'] = False
+
+# 获取全品种平值贴水（直接获取模式）
+def get_shared_atm_grid(option_data, option_mapping):
+    """立即返回最近一次的共享结果 (grid, computed_at)，尚未算出时为 (None, None)；
+    过期时启动一个后台线程重新获取，会话不等待，新结果在之后的刷新中生效"""
+    cache = get_atm_grid_cache()
+    with cache['lock']:
+        expired = (
+            cache['option_data'] is not option_data
+            or cache['computed_at'] is None
+            or time.time() - cache['computed_at'] >= ATM_GRID_TTL_SECONDS
+        )
+        if expired and not cache['refreshing']:
+            cache['refreshing'] = True
+            threading.Thread(
+                target=refresh_atm_grid,
+                args=(cache, option_data, option_mapping),
+                name="atm-grid-refresh",
+                daemon=True
+            ).start()
+        return cache['grid'], cache['computed_at']
+
+# 隐含远期曲线在多少秒内由查看同一ETF的会话共用：每次拟合需要每个合约月份一次上游调用
+FORWARD_CURVE_TTL_SECONDS = 15
 
-# 获取期权买一卖一价格
-def get_option_bid_ask_price(security_id):
-    """获取期权的买一价和卖一价"""
+@st.cache_resource
+def get_forward_curve_cache():
+    """进程级共享的隐含远期曲线：(ETF类型, 合约月份) -> {'computed_at', 'curve'}"""
+    return {'lock': threading.Lock(), 'entries': {}, 'refreshing': set()}
+
+# 后台重新拟合隐含远期曲线
+def refresh_forward_curve(cache, etf_type, months, etf_price):
+    """获取各月份全部行权价的最新价并拟合，附加到期时间后替换共享结果"""
+    key = (etf_type, months)
     try:
-        option_data = ak.option_sse_spot_price_sina(symbol=security_id)
-        
-        # 获取买一价
-        bid_price = None
-        try:
-            bid_price = float(option_data[option_data['字段'] == '买价']['值'].iloc[0])
-        except (IndexError, KeyError, ValueError):
-            bid_price = 0.0
-        
-        # 获取卖一价
-        ask_price = None
-        try:
-            ask_price = float(option_data[option_data['字段'] == '卖价']['值'].iloc[0])
-        except (IndexError, KeyError, ValueError):
-            ask_price = 0.0
-        
-        # 获取最新价作为参考
-        last_price = None
-        try:
-            last_price = float(option_data[option_data['字段'] == '最新价']['值'].iloc[0])
-        except (IndexError, KeyError, ValueError):
-            last_price = 0.0
+        forward_curve = calculate_implied_forwards(get_option_chain_quotes(etf_type, list(months)), etf_price)
         
-        return {
-            'bid_price': round(bid_price, 4) if bid_price > 0 else 0.0,
-            'ask_price': round(ask_price, 4) if ask_price > 0 else 0.0,
-            'last_price': round(last_price, 4) if last_price > 0 else 0.0
-        }
-        
-    except Exception as e:
-        return {
-            'bid_price': 0.0,
-            'ask_price': 0.0,
-            'last_price': 0.0,
-            'error': str(e)
-        }
+        # 附加到期时间，便于按期限比较基差
+        if not forward_curve.empty:
+            calendar = get_trading_calendar()
+            expiry_infos = [calendar.time_to_expiry(month) for month in forward_curve.index]
+            forward_curve['剩余交易日'] = [info['trading_days'] if info else None for info in expiry_infos]
+            forward_curve['年化基差率'] = [
+                rate / info['years'] if info and info['years'] > 0 else float('nan')
+                for rate, info in zip(forward_curve['基差率'], expiry_infos)
+            ]
+        with cache['lock']:
+            cache['entries'][key] = {'computed_at': time.time(), 'curve': forward_curve}
+    finally:
+        with cache['lock']:
+            cache['refreshing'].discard(key)
 
-# 获取实时ETF价格（不缓存，每次都获取最新价格）
-def get_real_time_etf_prices():
-    """获取实时ETF价格"""
-    etf_config = {
-        "sh510300": {"name": "300ETF", "keywords": ["沪深300", "300ETF"]},
-        "sh510500": {"name": "500ETF", "keywords": ["中证500", "500ETF"]},
-        "sh510050": {"name": "50ETF", "keywords": ["上证50", "50ETF"]},
-        "sh588000": {"name": "科创50ETF", "keywords": ["华夏科创50", "科创50ETF"]},
-        "sh588080": {"name": "科创板50ETF", "keywords": ["易方达科创50", "科创板50ETF", "易方达"]}
-    }
-    
-    etf_prices = {}
-    for symbol, config in etf_config.items():
-        try:
-            spot_price_df = ak.option_sse_underlying_spot_price_sina(symbol=symbol)
-            current_price = float(spot_price_df.loc[spot_price_df['字段'] == '最近成交价', '值'].iloc[0])
-            etf_prices[symbol] = round(current_price, 4)  # 保留4位小数
-        except Exception as e:
-            etf_prices[symbol] = 0.0  # 设置默认值
-    
-    return etf_config, etf_prices
-
-# 根据ETF类型获取对应的ETF价格
-def get_etf_price_for_type(etf_type_name, etf_config, etf_prices):
-    """根据ETF类型名称获取对应的ETF价格"""
-    # 创建所有可能的匹配项，按关键词长度降序排列
-    matches = []
-    for symbol, config in etf_config.items():
-        for keyword in config['keywords']:
-            if keyword in etf_type_name:
-                matches.append((len(keyword), symbol, keyword))
-    
-    # 按关键词长度降序排序，优先匹配更具体的关键词
-    matches.sort(reverse=True)
+# 获取隐含远期曲线
+def get_shared_forward_curve(etf_type, months, etf_price):
+    """立即返回 (ETF, 月份) 最近一次的共享曲线，尚未算出时为None；过期时启动一个后台线程重新拟合"""
+    cache = get_forward_curve_cache()
+    key = (etf_type, tuple(months))
+    now = time.time()
+    with cache['lock']:
+        # 月份滚动或长期无人查看的曲线不再保留
+        for stale_key in [
+            entry_key for entry_key, entry in cache['entries'].items()
+            if now - entry['computed_at'] > FORWARD_CURVE_TTL_SECONDS * 20
+        ]:
+            del cache['entries'][stale_key]
+        entry = cache['entries'].get(key)
+        if (entry is None or now - entry['computed_at'] >= FORWARD_CURVE_TTL_SECONDS) and key not in cache['refreshing']:
+            cache['refreshing'].add(key)
+            threading.Thread(
+                target=refresh_forward_curve,
+                args=(cache, etf_type, key[1], etf_price),
+                name="forward-curve-refresh",
+                daemon=True
+            ).start()
+        return entry['curve'] if entry is not None else None
+
+# 估算对象占用的内存
+def estimate_object_size(obj, seen=None):
+    """递归估算对象占用的字节数，DataFrame按深度内存统计"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
     
-    if matches:
-        return etf_prices.get(matches[0][1], 0.0)
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
     
-    # 默认返回300ETF价格
-    return etf_prices.get("sh510300", 0.0)
-
-# 计算时间价值
-def calculate_time_value(option_price, etf_price, strike_price, option_type):
-    """计算期权的时间价值：时间价值 = 交易价格 - 内在价值"""
-    if option_type.upper() == 'CALL' or option_type.upper() == 'C':
-        # Call期权内在价值 = max(标的价格 - 行权价, 0)
-        intrinsic_value = max(etf_price - strike_price, 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (dict, MappingProxyType)):
+        size += sum(estimate_object_size(k, seen) + estimate_object_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_object_size(item, seen) for item in obj)
+    return size
+
+# 登记当前会话的内存开销
+def update_session_registry(measure_size):
+    """更新当前会话的活动时间，并清理长时间不活动的会话。
+
+    递归估算会话状态大小开销较大，只在measure_size为True（会话状态有新数据）或尚未登记时重新估算，
+    其余重跑沿用上次的结果。
+    """
+    registry = get_session_registry()
+    session_id = st.session_state.session_id
+    now = time.time()
+    with registry['lock']:
+        previous = registry['sessions'].get(session_id)
+    if measure_size or previous is None:
+        session_bytes = estimate_object_size(dict(st.session_state.items()))
     else:
-        # Put期权内在价值 = max(行权价 - 标的价格, 0)
-        intrinsic_value = max(strike_price - etf_price, 0)
+        session_bytes = previous['bytes']
+    with registry['lock']:
+        registry['sessions'][session_id] = {
+            'last_seen': now,
+            'bytes': session_bytes
+        }
+        expired = [
+            session_id for session_id, info in registry['sessions'].items()
+            if now - info['last_seen'] > SESSION_IDLE_SECONDS
+        ]
+        for session_id in expired:
+            del registry['sessions'][session_id]
+
+# 生成内存报告
+def build_memory_report(option_data, option_mapping):
+    """共享数据与各会话开销的内存报告（字节）"""
+    registry = get_session_registry()
+    with registry['lock']:
+        session_sizes = [info['bytes'] for info in registry['sessions'].values()]
     
-    # 时间价值 = 交易价格 - 内在价值（可以为负数）
-    time_value = option_price - intrinsic_value
-    return time_value
+    shared_chain_bytes = estimate_object_size(option_data)
+    shared_mapping_bytes = estimate_object_size(option_mapping)
+    sessions_total = sum(session_sizes)
+    return {
+        'shared_chain_bytes': shared_chain_bytes,
+        'shared_mapping_bytes': shared_mapping_bytes,
+        'active_sessions': len(session_sizes),
+        'avg_session_bytes': sessions_total / len(session_sizes) if session_sizes else 0,
+        'max_session_bytes': max(session_sizes) if session_sizes else 0,
+        'total_bytes': shared_chain_bytes + shared_mapping_bytes + sessions_total
+    }
 
-# 计算贴水值
-def calculate_premium_value(call_time_value, put_time_value):
-    """计算贴水值：Put时间价值 - Call时间价值"""
-    return put_time_value - call_time_value
+# 期权基础数据（每个进程只创建一次），同时在后台提前导入akshare
+@st.cache_resource
+def get_reference_data():
+    """进程内共享的合约链和代码映射"""
+    warm_up()
+    return ReferenceData()
 
-# ETF类型映射
-ETF_DISPLAY_NAMES = {
-    "华泰柏瑞沪深300ETF期权": "300ETF",
-    "南方中证500ETF期权": "500ETF", 
-    "华夏上证50ETF期权": "50ETF",
-    "华夏科创50ETF期权": "科创50ETF",
-    "易方达科创50ETF期权": "科创板50ETF"
-}
+# 导出接口（每个进程只启动一次），端口被占用时不启用
+@st.cache_resource
+def get_export_server():
+    """启动本地导出接口，供下游系统读取最新贴水"""
+    try:
+        return start_export_server()
+    except OSError:
+        return None
+
+export_server = get_export_server()
+
+# 清理长期未使用的用户配置（每个进程一次）
+@st.cache_resource
+def prune_stale_profiles():
+    return prune_profiles()
+
+prune_stale_profiles()
+
+# 持久化到用户配置的会话状态
+PROFILE_SETTING_KEYS = [
+    'etf',
+    'month_1', 'strike_mode_1', 'strike_1', 'atm_offset_1', 'direction_1',
+    'month_2', 'strike_mode_2', 'strike_2', 'atm_offset_2', 'direction_2',
+    'show_forward_curve', 'show_atm_grid', 'quote_source', 'chart_range'
+]
+PROFILE_STATE_KEYS = [
+    'auto_refresh_active', 'today_date',
+    'max_premium_diff', 'max_premium_diff_time', 'premium_diff_history',
+    'historical_max_premium_diff', 'historical_max_premium_diff_datetime'
+]
+PROFILE_SNAPSHOT_KEYS = [
+    'price_data', 'etf_price', 'etf_quotes', 'group1_premium', 'group2_premium',
+    'premium_diff', 'quotes_stale', 'etf_quote_error', 'quotes_aged', 'quote_age',
+    'quotes_misaligned', 'snapshot_skew', 'snapshot_time'
+]
+
+# 从网址参数识别用户并恢复上次的配置和状态
+def restore_profile():
+    """每个会话执行一次：没有或无效的profile参数时生成新的标识并写回网址"""
+    profile_id = st.query_params.get('profile')
+    if not is_valid_profile_id(profile_id):
+        profile_id = new_profile_id()
+        st.query_params['profile'] = profile_id
+    st.session_state.profile_id = profile_id
+    
+    profile = load_profile(profile_id)
+    st.session_state.restored_settings = dict(profile.get('settings', {}))
+    st.session_state.restored_snapshot = profile.get('snapshot')
+    for key, value in profile.get('state', {}).items():
+        if key in PROFILE_STATE_KEYS:
+            st.session_state[key] = value
+
+# 恢复控件的上次取值（只恢复一次，取值已不在可选项中时忽略）
+def restore_widget(key, options=None):
+    restored = st.session_state.get('restored_settings', {})
+    if key not in restored:
+        return
+    value = restored.pop(key)
+    if key not in st.session_state and (options is None or value in options):
+        st.session_state[key] = value
+
+# 保存当前配置和状态，内容未变化时不写文件
+def save_current_profile(pair_key):
+    profile = {
+        'settings': {key: st.session_state[key] for key in PROFILE_SETTING_KEYS if key in st.session_state},
+        'state': {key: st.session_state[key] for key in PROFILE_STATE_KEYS if key in st.session_state},
+        'snapshot': {
+            'pair_key': pair_key,
+            'values': {key: st.session_state[key] for key in PROFILE_SNAPSHOT_KEYS if key in st.session_state}
+        } if 'price_data' in st.session_state else None
+    }
+    profile_text = serialize_profile(profile)
+    profile_hash = hash(profile_text)
+    if profile_hash != st.session_state.get('saved_profile_hash'):
+        if save_profile_text(st.session_state.profile_id, profile_text):
+            st.session_state.saved_profile_hash = profile_hash
 
 # 初始化会话状态
-if 'option_data' not in st.session_state:
-    st.session_state.option_data = None
-if 'option_mapping' not in st.session_state:
-    st.session_state.option_mapping = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'profile_id' not in st.session_state:
+    restore_profile()
 if 'auto_refresh_active' not in st.session_state:
     st.session_state.auto_refresh_active = False
 if 'last_auto_refresh_time' not in st.session_state:
@@ -342,25 +364,31 @@ if 'historical_max_premium_diff_datetime' not in st.session_state:
 # 侧边栏 - 用户选择界面
 st.sidebar.header("📋 选择期权合约")
 
-# 获取基础数据
-with st.spinner("正在加载期权数据..."):
-    if st.session_state.option_data is None:
-        st.session_state.option_data = get_basic_option_data()
-    if st.session_state.option_mapping is None:
-        st.session_state.option_mapping = get_option_code_mapping()
-
-option_data = st.session_state.option_data
-option_mapping = st.session_state.option_mapping
+# 获取基础数据（进程级共享，会话中只持有引用；先用持久化数据渲染，后台加载最新数据）
+reference_data = get_reference_data()
+reference_data.refresh_if_expired()
+option_data, option_mapping = reference_data.snapshot()
 
 if option_data is None or option_data.empty:
-    st.error("无法获取期权数据，请稍后重试")
+    if reference_data.loading:
+        st.info("⏳ 正在后台加载期权数据，页面将自动更新...")
+        time.sleep(1)
+        st.rerun()
+    st.error(f"无法获取期权数据，请稍后重试（{reference_data.last_error or '未知错误'}）")
     st.stop()
 
+if reference_data.partial:
+    st.sidebar.caption("⏳ 期权数据加载中，部分品种或月份暂未显示")
+elif reference_data.loading:
+    st.sidebar.caption("🔄 正在后台更新期权数据")
+
 # ETF类型选择
 etf_types = option_data['ETF类型'].unique().tolist()
+restore_widget('etf', etf_types)
 selected_etf = st.sidebar.selectbox(
     "选择ETF类型",
     etf_types,
+    key="etf",
     format_func=lambda x: ETF_DISPLAY_NAMES.get(x, x)
 )
 
@@ -368,26 +396,82 @@ selected_etf = st.sidebar.selectbox(
 filtered_data = option_data[option_data['ETF类型'] == selected_etf]
 available_months = sorted(filtered_data['合约月份'].unique().tolist())
 
+# 显示合约月份的到期日和剩余交易日
+def show_expiry_caption(contract_month):
+    """在侧边栏显示合约月份的到期信息"""
+    expiry_info = get_trading_calendar().time_to_expiry(contract_month)
+    if expiry_info:
+        st.sidebar.caption(
+            f"到期日 {expiry_info['expiry_date']}，剩余 {expiry_info['trading_days']} 个交易日"
+        )
+
+# 节假日文件未覆盖今年或明年时提示，否则这些年份的交易日和到期日只排除了周末
+missing_holiday_years = get_trading_calendar().missing_holiday_years()
+if missing_holiday_years:
+    st.sidebar.warning(
+        f"⚠️ holidays.txt 缺少 {'、'.join(map(str, missing_holiday_years))} 年的休市安排，"
+        "到期日和剩余交易日可能不准确，请按交易所公告补充"
+    )
+
+# 行权价选择方式
+STRIKE_MODE_FIXED = "固定行权价"
+STRIKE_MODE_ATM = "平值±档"
+
+# 获取可选行权价
+def get_available_strikes(month_data, standard_only=False):
+    """行权价以float32存储，转换回4位小数的float供显示和计算；standard_only时不含分红调整合约的行权价"""
+    if standard_only:
+        month_data = month_data[is_standard_contract(month_data['合约交易代码'])]
+    return sorted(month_data['行权价'].astype('float64').round(4).unique().tolist())
+
 # 第一组合约选择
 st.sidebar.subheader("🎯 第一组合约")
+restore_widget('month_1', available_months)
 selected_month_1 = st.sidebar.selectbox(
     "第一组合约月份",
     available_months,
     key="month_1"
 )
+show_expiry_caption(selected_month_1)
 
 # 获取第一组的可用行权价
 month_1_data = filtered_data[filtered_data['合约月份'] == selected_month_1]
-available_strikes_1 = sorted(month_1_data['行权价'].unique().tolist())
+available_strikes_1 = get_available_strikes(month_1_data)
+restore_widget('strike_mode_1', [STRIKE_MODE_FIXED, STRIKE_MODE_ATM])
 
-strike_1 = st.sidebar.selectbox(
-    "第一组行权价",
-    available_strikes_1,
-    index=0,
-    key="strike_1"
+strike_mode_1 = st.sidebar.radio(
+    "第一组行权价方式",
+    [STRIKE_MODE_FIXED, STRIKE_MODE_ATM],
+    horizontal=True,
+    key="strike_mode_1",
+    help="平值±档: 每次刷新按标的最新价格重新选取行权价，标的移动时自动跟随"
 )
+if strike_mode_1 == STRIKE_MODE_FIXED:
+    restore_widget('strike_1', available_strikes_1)
+    strike_1 = st.sidebar.selectbox(
+        "第一组行权价",
+        available_strikes_1,
+        index=0,
+        key="strike_1"
+    )
+else:
+    restore_widget('atm_offset_1', range(-10, 11))
+    # 默认平值；通过会话状态设置默认值，避免与恢复的取值冲突
+    if 'atm_offset_1' not in st.session_state:
+        st.session_state.atm_offset_1 = 0
+    atm_offset_1 = st.sidebar.number_input(
+        "第一组相对平值档数",
+        min_value=-10,
+        max_value=10,
+        step=1,
+        key="atm_offset_1",
+        help="0为平值，正数为更高行权价，负数为更低行权价"
+    )
+    strike_1 = None
+strike_caption_1 = st.sidebar.empty()
 
 # 第一组交易方向选择
+restore_widget('direction_1', ["Buy", "Sell"])
 trade_direction_1 = st.sidebar.selectbox(
     "第一组交易方向",
     ["Buy", "Sell"],
@@ -397,24 +481,52 @@ trade_direction_1 = st.sidebar.selectbox(
 
 # 第二组合约选择
 st.sidebar.subheader("🎯 第二组合约")
+restore_widget('month_2', available_months)
 selected_month_2 = st.sidebar.selectbox(
     "第二组合约月份",
     available_months,
     key="month_2"
 )
+show_expiry_caption(selected_month_2)
 
 # 获取第二组的可用行权价
 month_2_data = filtered_data[filtered_data['合约月份'] == selected_month_2]
-available_strikes_2 = sorted(month_2_data['行权价'].unique().tolist())
+available_strikes_2 = get_available_strikes(month_2_data)
+restore_widget('strike_mode_2', [STRIKE_MODE_FIXED, STRIKE_MODE_ATM])
 
-strike_2 = st.sidebar.selectbox(
-    "第二组行权价",
-    available_strikes_2,
-    index=0,
-    key="strike_2"
+strike_mode_2 = st.sidebar.radio(
+    "第二组行权价方式",
+    [STRIKE_MODE_FIXED, STRIKE_MODE_ATM],
+    horizontal=True,
+    key="strike_mode_2",
+    help="平值±档: 每次刷新按标的最新价格重新选取行权价，标的移动时自动跟随"
 )
+if strike_mode_2 == STRIKE_MODE_FIXED:
+    restore_widget('strike_2', available_strikes_2)
+    strike_2 = st.sidebar.selectbox(
+        "第二组行权价",
+        available_strikes_2,
+        index=0,
+        key="strike_2"
+    )
+else:
+    restore_widget('atm_offset_2', range(-10, 11))
+    # 默认平值；通过会话状态设置默认值，避免与恢复的取值冲突
+    if 'atm_offset_2' not in st.session_state:
+        st.session_state.atm_offset_2 = 0
+    atm_offset_2 = st.sidebar.number_input(
+        "第二组相对平值档数",
+        min_value=-10,
+        max_value=10,
+        step=1,
+        key="atm_offset_2",
+        help="0为平值，正数为更高行权价，负数为更低行权价"
+    )
+    strike_2 = None
+strike_caption_2 = st.sidebar.empty()
 
 # 第二组交易方向选择
+restore_widget('direction_2', ["Buy", "Sell"])
 trade_direction_2 = st.sidebar.selectbox(
     "第二组交易方向",
     ["Buy", "Sell"],
@@ -422,6 +534,37 @@ trade_direction_2 = st.sidebar.selectbox(
     help="Buy: Call取卖一价，Put取买一价；Sell: Call取买一价，Put取卖一价"
 )
 
+# 扩展分析开关
+st.sidebar.subheader("📐 扩展分析")
+restore_widget('show_forward_curve', [True, False])
+show_forward_curve = st.sidebar.checkbox(
+    "显示各月份隐含远期与合成基差",
+    value=False,
+    key="show_forward_curve",
+    help="每次刷新时获取各合约月份整条行权价梯队，按看涨看跌平价回归隐含远期"
+)
+
+# 全品种平值贴水开关
+restore_widget('show_atm_grid', [True, False])
+show_atm_grid = st.sidebar.checkbox(
+    "显示全品种平值贴水",
+    value=False,
+    key="show_atm_grid",
+    help="每次刷新时为所有ETF和合约月份选取平值行权价，计算贴水并除以标的价格，便于跨品种比较"
+)
+
+# 行情来源选择
+st.sidebar.subheader("📡 行情来源")
+restore_widget('quote_source', ["直接获取", "行情总线"])
+quote_source = st.sidebar.radio(
+    "行情来源",
+    ["直接获取", "行情总线"],
+    key="quote_source",
+    label_visibility="collapsed",
+    help="直接获取: 本页面直接请求上游行情；行情总线: 从独立运行的 quote_collector.py 采集进程读取快照"
+)
+use_quote_bus = quote_source == "行情总线"
+
 # 刷新控制按钮
 st.sidebar.subheader("🔄 刷新控制")
 col_refresh, col_stop = st.sidebar.columns(2)
@@ -440,6 +583,78 @@ if refresh_button:
 if stop_button:
     st.session_state.auto_refresh_active = False
 
+# 当前合约组合的历史存储键（平值±档模式按档位记录，行权价随标的变化也是同一条序列）
+strike_label_1 = f"ATM{atm_offset_1:+d}" if strike_mode_1 == STRIKE_MODE_ATM else strike_1
+strike_label_2 = f"ATM{atm_offset_2:+d}" if strike_mode_2 == STRIKE_MODE_ATM else strike_2
+pair_key = make_pair_key(
+    ETF_DISPLAY_NAMES.get(selected_etf, selected_etf),
+    (selected_month_1, strike_label_1, trade_direction_1),
+    (selected_month_2, strike_label_2, trade_direction_2)
+)
+# 同一组合按滚动月份（M0/M1/...，当前挂牌的第1/2/...个月份）的存储键，用于查找默认回填的收盘贴水
+rolling_pair_key = make_pair_key(
+    ETF_DISPLAY_NAMES.get(selected_etf, selected_etf),
+    (f"M{available_months.index(selected_month_1)}", strike_label_1, trade_direction_1),
+    (f"M{available_months.index(selected_month_2)}", strike_label_2, trade_direction_2)
+)
+
+# 恢复的上次快照属于当前合约组合时直接用于渲染，同一轮仍获取最新行情（快照可能已是几天前的）
+restored_snapshot = st.session_state.pop('restored_snapshot', None)
+snapshot_applied = False
+if restored_snapshot and restored_snapshot.get('pair_key') == pair_key:
+    for key, value in restored_snapshot.get('values', {}).items():
+        if key in PROFILE_SNAPSHOT_KEYS:
+            st.session_state[key] = value
+    st.session_state.snapshot_restored = True
+    snapshot_applied = True
+
+# 检查是否需要刷新数据
+current_time = time.time()
+should_refresh = snapshot_applied
+
+# 检查是否需要重置当天记录（新的一天）
+current_date = datetime.date.today().strftime('%Y-%m-%d')
+if st.session_state.today_date != current_date:
+    st.session_state.today_date = current_date
+    st.session_state.max_premium_diff = None
+    st.session_state.max_premium_diff_time = None
+    st.session_state.premium_diff_history = []
+
+# 判断是否需要刷新
+if refresh_button:
+    should_refresh = True
+elif st.session_state.auto_refresh_active and (current_time - st.session_state.last_auto_refresh_time >= 5):
+    should_refresh = True
+    st.session_state.last_auto_refresh_time = current_time
+elif 'price_data' not in st.session_state:
+    should_refresh = True
+
+# 刷新时先获取标的价格，平值行权价和平值贴水需要用最新价格选取合约；
+# 当前组合的标的价格之后会与四条腿同批重新获取，这里只取选取合约需要的标的
+current_etf_symbol = get_etf_symbol_for_type(selected_etf, ETF_CONFIG)
+if should_refresh:
+    if use_quote_bus:
+        bus_snapshot = read_merged_snapshot()
+        st.session_state.etf_quotes = bus_snapshot['etf_quotes']
+    elif STRIKE_MODE_ATM in (strike_mode_1, strike_mode_2):
+        st.session_state.etf_quotes = {
+            **st.session_state.get('etf_quotes', {}),
+            **get_real_time_etf_quotes([current_etf_symbol])
+        }
+
+etf_quotes = st.session_state.get('etf_quotes', {})
+etf_prices = {symbol: quote.get('price', 0.0) for symbol, quote in etf_quotes.items()}
+current_etf_quote = etf_quotes.get(current_etf_symbol, {})
+current_etf_price = current_etf_quote.get('price', 0.0)
+
+# 平值±档模式下按最新标的价格解析行权价
+if strike_mode_1 == STRIKE_MODE_ATM:
+    strike_1 = resolve_atm_strike(get_available_strikes(month_1_data, standard_only=True), current_etf_price, atm_offset_1)
+    strike_caption_1.caption(f"平值{atm_offset_1:+d}档 → 行权价 {strike_1}（标的 {current_etf_price:.4f}）")
+if strike_mode_2 == STRIKE_MODE_ATM:
+    strike_2 = resolve_atm_strike(get_available_strikes(month_2_data, standard_only=True), current_etf_price, atm_offset_2)
+    strike_caption_2.caption(f"平值{atm_offset_2:+d}档 → 行权价 {strike_2}（标的 {current_etf_price:.4f}）")
+
 # 主界面显示
 st.subheader(f"{ETF_DISPLAY_NAMES.get(selected_etf, selected_etf)} 期权合约对比")
 st.markdown(f"**第一组:** {trade_direction_1} {selected_month_1}月 行权价{strike_1} | **第二组:** {trade_direction_2} {selected_month_2}月 行权价{strike_2}")
@@ -449,8 +664,11 @@ def get_contract_codes(etf_type, month, strike):
     """获取指定条件的Call和Put合约代码"""
     # 根据月份过滤数据
     month_data = filtered_data[filtered_data['合约月份'] == month]
-    contracts = month_data[month_data['行权价'] == strike]
+    contracts = month_data[month_data['行权价'].astype('float64').round(4) == strike]
     
+    # 同一行权价同时有标准合约和分红调整合约时取标准合约，与平值档位和历史回填一致
+    standard = is_standard_contract(contracts['合约交易代码'])
+    contracts = pd.concat([contracts[standard], contracts[~standard]])
     call_contracts = contracts[contracts['合约交易代码'].str.contains('C')]
     put_contracts = contracts[contracts['合约交易代码'].str.contains('P')]
     
@@ -470,36 +688,47 @@ contracts_info = [
     {"name": f"Put {selected_month_2}-{strike_2}", "code": put_2, "type": "Put", "strike": strike_2, "month": selected_month_2},
 ]
 
-# 检查是否需要刷新数据
-current_time = time.time()
-should_refresh = False
-
-# 检查是否需要重置当天记录（新的一天）
-current_date = datetime.date.today().strftime('%Y-%m-%d')
-if st.session_state.today_date != current_date:
-    st.session_state.today_date = current_date
-    st.session_state.max_premium_diff = None
-    st.session_state.max_premium_diff_time = None
-    st.session_state.premium_diff_history = []
-
-# 判断是否需要刷新
-if refresh_button:
-    should_refresh = True
-elif st.session_state.auto_refresh_active and (current_time - st.session_state.last_auto_refresh_time >= 5):
-    should_refresh = True
-    st.session_state.last_auto_refresh_time = current_time
-elif 'price_data' not in st.session_state:
-    should_refresh = True
-
 # 显示合约信息
 if should_refresh:
-        # 获取ETF实时价格
-        etf_config, etf_prices = get_real_time_etf_prices()
-        current_etf_price = get_etf_price_for_type(selected_etf, etf_config, etf_prices)
+        if use_quote_bus:
+            # 按各ETF现价选取平值合约
+            atm_legs = select_atm_legs(option_data, option_mapping, etf_prices) if show_atm_grid else pd.DataFrame()
+            
+            # 登记本会话需要的合约，由采集进程统一轮询
+            subscribed_legs = [
+                {'code': contract['code'], 'security_id': option_mapping[contract['code']]['security_id']}
+                for contract in contracts_info
+                if contract['code'] is not None and contract['code'] in option_mapping
+            ]
+            for _, leg in atm_legs.iterrows():
+                for code_column, id_column in (('call_code', 'call_security_id'), ('put_code', 'put_security_id')):
+                    if leg[id_column]:
+                        subscribed_legs.append({'code': leg[code_column], 'security_id': leg[id_column]})
+            publish_subscription(st.session_state.session_id, subscribed_legs)
         
-        price_results = []
+        # 本组合四条腿的security_id
+        pair_security_ids = [
+            option_mapping[contract['code']]['security_id']
+            for contract in contracts_info
+            if contract['code'] is not None and contract['code'] in option_mapping
+        ]
+        
+        # 标的和四条腿在同一时间窗口内获取，避免用相隔数秒的价格计算贴水
+        if use_quote_bus:
+            # 采集进程每轮并发获取标的和合约，这里只衡量时间差和报价年龄
+            leg_quotes = bus_snapshot['quotes']
+            snapshot_skew, misaligned = measure_skew({
+                current_etf_symbol: current_etf_quote,
+                **{security_id: leg_quotes[security_id] for security_id in pair_security_ids if security_id in leg_quotes}
+            })
+        else:
+            aligned = get_aligned_quotes([current_etf_symbol], pair_security_ids)
+            leg_quotes = aligned['quotes']
+            snapshot_skew, misaligned = aligned['skew'], aligned['misaligned']
+            current_etf_quote = aligned['etf_quotes'][current_etf_symbol]
+            current_etf_price = current_etf_quote.get('price', 0.0)
+            st.session_state.etf_quotes = {**st.session_state.get('etf_quotes', {}), current_etf_symbol: current_etf_quote}
         
-        # 使用线程池并行获取价格
         def get_contract_price(contract_info):
             if contract_info['code'] is None:
                 return {
@@ -526,8 +755,17 @@ if should_refresh:
                     'error': '无法获取security_id'
                 }
             
-            # 获取价格
-            price_data = get_option_bid_ask_price(security_id)
+            quote = leg_quotes.get(security_id)
+            if quote is None:
+                return {
+                    'name': contract_info['name'],
+                    'code': contract_info['code'],
+                    'bid_price': 0.0,
+                    'ask_price': 0.0,
+                    'last_price': 0.0,
+                    'error': '行情总线暂无报价，请确认采集进程已启动'
+                }
+            price_data = dict(quote)
             price_data['name'] = contract_info['name']
             price_data['code'] = contract_info['code']
             price_data['strike'] = contract_info['strike']
@@ -536,24 +774,15 @@ if should_refresh:
             
             return price_data
         
-        # 并行获取所有合约价格
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = {executor.submit(get_contract_price, contract): contract for contract in contracts_info}
-            
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    price_results.append(result)
-                except Exception as e:
-                    contract = futures[future]
-                    price_results.append({
-                        'name': contract['name'],
-                        'code': contract.get('code', 'N/A'),
-                        'bid_price': 0.0,
-                        'ask_price': 0.0,
-                        'last_price': 0.0,
-                        'error': str(e)
-                    })
+        # 按合约顺序整理报价
+        price_results = [get_contract_price(contract) for contract in contracts_info]
+        
+        # 采集进程停止后，总线快照在过期前仍可读到，各腿时间差也仍然很小，需按报价年龄判断
+        quote_age = measure_age({
+            current_etf_symbol: current_etf_quote,
+            **{str(index): price for index, price in enumerate(price_results)}
+        })
+        quotes_aged = quote_age is not None and quote_age > MAX_QUOTE_AGE
         
         # 计算贴水值
         def calculate_group_premium(group_num, trade_direction, month, strike):
@@ -563,6 +792,8 @@ if should_refresh:
             
             if not call_data or not put_data or 'error' in call_data or 'error' in put_data:
                 return None
+            if current_etf_price <= 0:
+                return None
             
             # 根据交易方向选择价格
             if trade_direction == "Buy":
@@ -574,6 +805,10 @@ if should_refresh:
                 call_price = call_data['bid_price']
                 put_price = put_data['ask_price']
             
+            # 缺失报价（0）会算出虚假的贴水值
+            if call_price <= 0 or put_price <= 0:
+                return None
+            
             # 计算时间价值
             call_time_value = calculate_time_value(call_price, current_etf_price, strike, 'CALL')
             put_time_value = calculate_time_value(put_price, current_etf_price, strike, 'PUT')
@@ -599,9 +834,15 @@ if should_refresh:
         
         # 计算贴水值差值
         premium_diff = None
+        # 任一报价来自过期缓存，或重新获取后各腿时间差仍超出窗口时只展示，不计入历史和最大值统计
+        quotes_misaligned = bool(misaligned)
+        # 标的价格获取失败时没有可回退的缓存，单独提示
+        etf_quote_error = current_etf_quote.get('error') if current_etf_quote else '暂无标的价格'
+        quotes_stale = (current_etf_quote.get('stale', False) and not etf_quote_error) or any(p.get('stale') for p in price_results)
         if group1_premium and group2_premium:
             premium_diff = group2_premium['premium_value'] - group1_premium['premium_value']
-            
+        
+        if premium_diff is not None and not etf_quote_error and not quotes_stale and not quotes_aged and not quotes_misaligned:
             # 记录贴水差值历史
             beijing_tz = datetime.timezone(datetime.timedelta(hours=8))
             current_datetime = datetime.datetime.now(beijing_tz)
@@ -613,13 +854,27 @@ if should_refresh:
                 'time': current_time_str,
                 'diff': premium_diff,
                 'group1_premium': group1_premium['premium_value'],
-                'group2_premium': group2_premium['premium_value']
+                'group2_premium': group2_premium['premium_value'],
+                'strike1': strike_1,
+                'strike2': strike_2
             })
             
             # 只保留最近50条记录
             if len(st.session_state.premium_diff_history) > 50:
                 st.session_state.premium_diff_history = st.session_state.premium_diff_history[-50:]
             
+            # 写入本地历史存储，供走势图使用
+            append_tick(
+                pair_key,
+                current_datetime,
+                premium_diff,
+                group1_premium['premium_value'],
+                group2_premium['premium_value'],
+                strike_1,
+                strike_2,
+                writer_id=st.session_state.session_id
+            )
+            
             # 更新当天最大贴水差值
             if st.session_state.max_premium_diff is None or abs(premium_diff) > abs(st.session_state.max_premium_diff):
                 st.session_state.max_premium_diff = premium_diff
@@ -636,6 +891,50 @@ if should_refresh:
         st.session_state.group1_premium = group1_premium
         st.session_state.group2_premium = group2_premium
         st.session_state.premium_diff = premium_diff
+        st.session_state.quotes_stale = quotes_stale
+        st.session_state.etf_quote_error = etf_quote_error
+        st.session_state.quotes_misaligned = quotes_misaligned
+        st.session_state.quotes_aged = quotes_aged
+        st.session_state.quote_age = quote_age
+        st.session_state.snapshot_skew = snapshot_skew
+        st.session_state.snapshot_time = time.time()
+        st.session_state.snapshot_restored = False
+        
+        # 发布到进程内快照，导出接口直接读取，不额外请求上游
+        if group1_premium and group2_premium:
+            get_snapshot_store().publish(pair_key, {
+                'etf': ETF_DISPLAY_NAMES.get(selected_etf, selected_etf),
+                'etf_price': current_etf_price,
+                'group1': group1_premium,
+                'group2': group2_premium,
+                'premium_diff': premium_diff,
+                'stale': quotes_stale or quotes_aged,
+                'misaligned': quotes_misaligned,
+                'skew_seconds': snapshot_skew,
+                'timestamp': time.time()
+            })
+        
+        # 全品种平值贴水：行情总线模式直接用总线报价计算，直接获取模式使用进程内共享结果
+        if show_atm_grid:
+            if use_quote_bus:
+                st.session_state.atm_grid = calculate_atm_premium_grid(
+                    atm_legs, bus_snapshot['quotes'], bus_snapshot['etf_quotes']
+                )
+                st.session_state.atm_grid_time = bus_snapshot['published']
+            else:
+                shared_atm_grid, shared_atm_grid_time = get_shared_atm_grid(option_data, option_mapping)
+                if shared_atm_grid is not None:
+                    st.session_state.atm_grid = shared_atm_grid
+                    st.session_state.atm_grid_time = shared_atm_grid_time
+        
+        # 各合约月份的隐含远期和合成基差曲线，查看同一ETF的会话共用
+        if show_forward_curve:
+            forward_curve = get_shared_forward_curve(selected_etf, available_months, current_etf_price)
+            if forward_curve is not None:
+                st.session_state.forward_curve = forward_curve
+            else:
+                # 切换ETF后不再显示上一个ETF的曲线
+                st.session_state.pop('forward_curve', None)
 
 # 创建固定的状态显示区域
 status_container = st.container()
@@ -665,8 +964,34 @@ with status_container:
         # 显示最后更新时间
         if 'price_data' in st.session_state:
             beijing_tz = datetime.timezone(datetime.timedelta(hours=8))
-            beijing_time = datetime.datetime.now(beijing_tz)
-            st.info(f"⏰ {beijing_time.strftime('%H:%M:%S')}")
+            snapshot_time = st.session_state.get('snapshot_time')
+            beijing_time = (
+                datetime.datetime.fromtimestamp(snapshot_time, beijing_tz) if snapshot_time
+                else datetime.datetime.now(beijing_tz)
+            )
+            if st.session_state.get('snapshot_restored'):
+                # 恢复的快照在首次获取到新行情前一直标明其保存时间
+                st.info(f"♻️ 恢复的快照 {beijing_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            else:
+                skew = st.session_state.get('snapshot_skew')
+                skew_text = f" · 腿间时差 {skew:.2f}秒" if skew is not None else ""
+                st.info(f"⏰ {beijing_time.strftime('%H:%M:%S')}{skew_text}")
+
+# 上游异常时提示当前报价来自缓存，或标的价格完全不可用
+if st.session_state.get('etf_quote_error'):
+    st.error(f"❌ 标的价格获取失败（{st.session_state.etf_quote_error}），本次无法计算贴水")
+if st.session_state.get('quotes_stale'):
+    st.warning("⚠️ 部分报价来自最近一次成功获取的缓存（上游限流或异常），本次结果不计入最大值和历史记录")
+elif st.session_state.get('quotes_aged'):
+    st.warning(
+        f"⚠️ 报价已 {st.session_state.quote_age:.0f} 秒未更新（超过 {MAX_QUOTE_AGE:g} 秒），"
+        "请确认行情采集进程正在运行；本次结果不计入最大值和历史记录"
+    )
+elif st.session_state.get('quotes_misaligned'):
+    st.warning(
+        f"⚠️ 标的和各腿报价的获取时间相差 {st.session_state.snapshot_skew or 0:.2f} 秒"
+        f"（超过 {MAX_SNAPSHOT_SKEW:g} 秒），本次结果不计入最大值和历史记录"
+    )
 
 # 显示当天最大贴水差值和历史最大贴水差值
 max_diff_col1, max_diff_col2 = st.columns(2)
@@ -687,6 +1012,22 @@ with max_diff_col2:
             help=f"记录时间: {st.session_state.historical_max_premium_diff_datetime}"
         )
 
+# 历史回填的每日收盘贴水差值分布（由 premium_backfill.py 生成）；具体月份没有回填时使用滚动月份的回填
+daily_premiums = load_daily_premiums(pair_key)
+if daily_premiums is None or daily_premiums.empty:
+    daily_premiums = load_daily_premiums(rolling_pair_key)
+if daily_premiums is not None and not daily_premiums.empty:
+    daily_diff = daily_premiums['diff']
+    daily_caption = (
+        f"📚 收盘贴水差值回填（{len(daily_premiums)}个交易日，"
+        f"{daily_premiums['date'].iloc[0]} ~ {daily_premiums['date'].iloc[-1]}）："
+        f"最大 {daily_diff.max():.4f}，最小 {daily_diff.min():.4f}，中位数 {daily_diff.median():.4f}"
+    )
+    if st.session_state.get('premium_diff') is not None:
+        percentile = (daily_diff <= st.session_state.premium_diff).mean() * 100
+        daily_caption += f"，当前值位于第 {percentile:.0f} 百分位"
+    st.caption(daily_caption)
+
 # 显示贴水分析结果
 if 'group1_premium' in st.session_state and 'group2_premium' in st.session_state and 'premium_diff' in st.session_state:
     group1 = st.session_state.group1_premium
@@ -729,6 +1070,63 @@ if 'group1_premium' in st.session_state and 'group2_premium' in st.session_state
                 help="第二组贴水值 - 第一组贴水值"
             )
 
+# 显示全品种平值贴水
+if show_atm_grid and 'atm_grid' not in st.session_state:
+    st.markdown("### 📊 全品种平值贴水（贴水 / 标的价格，%）")
+    st.info("📊 正在后台获取全品种平值报价，下次刷新时显示")
+elif show_atm_grid:
+    atm_grid = st.session_state.atm_grid
+    atm_grid_time = st.session_state.get('atm_grid_time')
+    grid_time_text = ""
+    if atm_grid_time:
+        beijing_tz = datetime.timezone(datetime.timedelta(hours=8))
+        grid_time = datetime.datetime.fromtimestamp(atm_grid_time, beijing_tz)
+        grid_time_text = f" · {grid_time.strftime('%H:%M:%S')} 获取，{max(time.time() - atm_grid_time, 0):.0f}秒前"
+    st.markdown(f"### 📊 全品种平值贴水（贴水 / 标的价格，%）{grid_time_text}")
+    if atm_grid.empty:
+        st.warning("暂无可用的平值合约报价")
+    else:
+        grid_col1, grid_col2 = st.columns([3, 2])
+        with grid_col1:
+            st.dataframe(
+                atm_grid.pivot(index='ETF类型', columns='合约月份', values='贴水率(%)').rename(index=ETF_DISPLAY_NAMES).round(4),
+                use_container_width=True
+            )
+        with grid_col2:
+            st.dataframe(
+                atm_grid.pivot(index='ETF类型', columns='合约月份', values='行权价').rename(index=ETF_DISPLAY_NAMES),
+                use_container_width=True
+            )
+            st.caption("右表为各ETF各月份选用的平值行权价")
+        stale_cells = atm_grid[atm_grid['过期']]
+        if not stale_cells.empty:
+            stale_names = [
+                f"{ETF_DISPLAY_NAMES.get(row['ETF类型'], row['ETF类型'])} {row['合约月份']}"
+                for _, row in stale_cells.iterrows()
+            ]
+            st.warning(f"⚠️ 以下平值贴水使用了上游失败时回退的旧报价：{'、'.join(stale_names)}")
+
+# 显示合成基差曲线
+if show_forward_curve and 'forward_curve' not in st.session_state:
+    st.markdown("### 📐 隐含远期与合成基差")
+    st.info("📐 正在后台获取各月份合约链，下次刷新时显示")
+elif show_forward_curve:
+    forward_curve = st.session_state.forward_curve
+    st.markdown("### 📐 隐含远期与合成基差")
+    if forward_curve.empty:
+        st.warning("暂无足够的当日有成交的行权价拟合隐含远期")
+    else:
+        curve_col1, curve_col2 = st.columns([3, 2])
+        with curve_col1:
+            st.dataframe(
+                forward_curve.reset_index().round(4),
+                use_container_width=True,
+                hide_index=True
+            )
+        with curve_col2:
+            st.line_chart(forward_curve['合成基差'])
+        st.caption("只使用Call和Put当日都有成交的行权价拟合，成交时间可能早于当前标的价格")
+
 # 显示价格数据
 if 'price_data' in st.session_state:
     price_data = st.session_state.price_data
@@ -850,6 +1248,32 @@ if 'price_data' in st.session_state:
                 if 'error' in put_2_data:
                     st.error(f"错误: {put_2_data['error']}")
 
+# 显示贴水差值走势图（服务端降采样，点数有上限）
+st.markdown("### 📉 贴水差值走势")
+restore_widget('chart_range', list(CHART_RANGES.keys()))
+chart_range = st.radio(
+    "时间范围",
+    list(CHART_RANGES.keys()),
+    horizontal=True,
+    key="chart_range",
+    label_visibility="collapsed"
+)
+beijing_today = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=8))).date()
+chart_data = load_chart_data(
+    pair_key,
+    get_chart_dates(get_trading_calendar(), beijing_today, CHART_RANGES[chart_range])
+)
+if chart_data.empty:
+    st.caption("暂无走势数据，开始自动刷新后将自动记录")
+else:
+    chart_data = chart_data.rename(columns={
+        'timestamp': '时间',
+        'diff': '贴水差值',
+        'group1_premium': '第一组贴水',
+        'group2_premium': '第二组贴水'
+    })
+    st.line_chart(chart_data.set_index('时间')[['贴水差值', '第一组贴水', '第二组贴水']])
+
 # 显示贴水差值历史记录
 if st.session_state.premium_diff_history:
     with st.expander("📈 贴水差值历史记录", expanded=False):
@@ -860,9 +1284,59 @@ if st.session_state.premium_diff_history:
             history_df['diff'] = history_df['diff'].round(4)
             history_df['group1_premium'] = history_df['group1_premium'].round(4)
             history_df['group2_premium'] = history_df['group2_premium'].round(4)
-            history_df.columns = ['时间', '贴水差值', '第一组贴水', '第二组贴水']
+            history_df = history_df.rename(columns={
+                'time': '时间',
+                'diff': '贴水差值',
+                'group1_premium': '第一组贴水',
+                'group2_premium': '第二组贴水',
+                'strike1': '第一组行权价',
+                'strike2': '第二组行权价'
+            })
             st.dataframe(history_df.iloc[::-1], use_container_width=True, hide_index=True)  # 倒序显示，最新的在上面
 
+# 上游接口状态
+with st.sidebar.expander("🛡️ 上游接口状态", expanded=False):
+    upstream_status = get_upstream_client().status()
+    if upstream_status:
+        state_names = {'closed': '正常', 'open': '熔断中', 'half_open': '试探中'}
+        for endpoint, status in upstream_status.items():
+            st.markdown(f"- `{endpoint}`: {state_names.get(status['state'], status['state'])}（连续失败 {status['failures']} 次）")
+    else:
+        st.caption("暂无调用记录")
+
+# 导出接口状态
+with st.sidebar.expander("📤 导出接口", expanded=False):
+    if export_server is not None:
+        st.markdown(f"""
+- 最新快照: `http://{EXPORT_HOST}:{EXPORT_PORT}/snapshot?pairs={pair_key}`
+- 持续推送: `http://{EXPORT_HOST}:{EXPORT_PORT}/stream?pairs={pair_key}`
+- 组合列表: `http://{EXPORT_HOST}:{EXPORT_PORT}/pairs`
+
+快照的 `age_seconds` 为距页面上次刷新的秒数，超过 {SNAPSHOT_STALE_SECONDS:.0f} 秒未刷新时 `stale` 为 true。
+""")
+    else:
+        st.caption(f"端口 {EXPORT_PORT} 已被占用，导出接口未启动（可通过环境变量 PREMIUM_EXPORT_PORT 修改）")
+
+# 内存报告：会话状态只在刷新行情后变化，只在刷新时或查看报告时重新估算本会话大小
+update_session_registry(should_refresh or st.session_state.get('show_memory_report', False))
+with st.sidebar.expander("🧠 内存报告", expanded=False):
+    if st.checkbox("统计内存占用", key="show_memory_report"):
+        memory_report = build_memory_report(option_data, option_mapping)
+        st.markdown(f"""
+- 共享期权链: {memory_report['shared_chain_bytes'] / 1024 / 1024:.2f} MB
+- 共享代码映射: {memory_report['shared_mapping_bytes'] / 1024 / 1024:.2f} MB
+- 活跃会话数: {memory_report['active_sessions']}
+- 单会话平均开销: {memory_report['avg_session_bytes'] / 1024:.1f} KB
+- 单会话最大开销: {memory_report['max_session_bytes'] / 1024:.1f} KB
+- 合计估算: {memory_report['total_bytes'] / 1024 / 1024:.2f} MB
+""")
+
+# 保存用户配置，重连或服务重启后可立即恢复
+save_current_profile(pair_key)
+with st.sidebar.expander("🔖 用户配置", expanded=False):
+    st.caption(f"配置标识: {st.session_state.profile_id}")
+    st.caption("当前选择、最大贴水差值和最近一次快照已自动保存，收藏当前网址即可在重连或服务重启后恢复")
+
 # 自动刷新逻辑
 if st.session_state.auto_refresh_active:
     time_since_last_refresh = time.time() - st.session_state.last_auto_refresh_time
@@ -884,14 +1358,16 @@ st.markdown("""
 2. 分别选择第一组和第二组的合约月份、行权价和交易方向：
    - **Buy**: Call期权取卖一价，Put期权取买一价
    - **Sell**: Call期权取买一价，Put期权取卖一价
-3. 点击"开始自动刷新"按钮启动每5秒自动更新，点击"停止刷新"按钮停止自动更新
-4. 系统会显示：
+3. 行权价可选择"固定行权价"，或"平值±档"：每次刷新按标的最新价格选取最接近的行权价再偏移指定档数，历史记录中会标注实际使用的行权价
+4. 点击"开始自动刷新"按钮启动每5秒自动更新，点击"停止刷新"按钮停止自动更新
+5. 系统会显示：
    - 自动刷新状态和ETF当前价格
    - 今日最大贴水差值（绝对值）和记录时间
    - 历史最大贴水差值（绝对值）和记录日期时间
    - 两组合约的贴水值和贴水值差值
    - 每个合约的详细价格信息（⭐标记表示用于计算的价格）
    - 最近5次贴水差值变化历史
+   - 贴水差值和两组贴水的走势图，可选择今日或近5/20/60个交易日
 
 ### 贴水值计算说明
 - **内在价值**：
@@ -900,6 +1376,8 @@ st.markdown("""
 - **时间价值** = 交易价格 - 内在价值
 - **贴水值** = Put时间价值 - Call时间价值
 - **贴水值差值** = 第二组贴水值 - 第一组贴水值
+- **平值贴水率**：每个ETF每个合约月份取最接近现价的行权价，用买卖中间价计算贴水值，再除以标的价格（%）以便跨品种比较
+- **合成基差**：对每个合约月份的全部行权价回归 Call - Put = D×F - D×K，得到贴现因子D和隐含远期F，合成基差 = F - ETF价格
 
 ### 注意事项
 - 价格数据来源于实时行情，可能存在延迟
@@ -907,5 +1385,14 @@ st.markdown("""
 - 自动刷新功能每5秒更新一次数据，会自动记录当天和历史最大贴水差值
 - 今日最大贴水差值每天开始时会重置，历史最大贴水差值会持续保持
 - 所有时间均为北京时间（UTC+8）
+- 期权合约链和代码映射保存在本地 data/cache 目录，启动时先用本地数据立即显示，过期后在后台自动更新
+- 当前选择、自动刷新状态、最大贴水差值和最近一次快照按网址中的 profile 参数保存在本地 data/profiles 目录，收藏网址后重连或服务重启可立即恢复
+- 下游系统可通过本地导出接口读取最新贴水（JSON）或订阅推送流（JSON Lines），地址见左侧"导出接口"
+- 走势数据按合约组合和交易日保存在本地 data/premium_ticks 目录，图表最多显示1000个点（LTTB降采样）
+- 上游接口限流或异常时会自动限速、重试和熔断，并暂时显示最近一次成功获取的报价，这些报价不计入最大值和历史记录
+- 标的和四条腿的报价在同一批并发请求中获取，接收时间相差超过1秒时重新获取落后的报价，仍超出时本次结果不计入最大值和历史记录
 - 建议在交易时间内使用以获取准确的价格信息
+- 多人同时使用时，可先运行 `python quote_collector.py`（可按标的分多个进程）采集行情，再在左侧选择"行情总线"，所有页面共享同一份上游轮询
+- 合约到期日和交易日依据本地 holidays.txt 中的交易所休市安排计算，每年需追加下一年的休市日
+- 运行 `python premium_backfill.py` 可用交易所日线回填过去数月的每日收盘贴水（如 `--pair 300ETF,2612,ATM+0,Buy,2703,ATM+0,Buy`），页面中月份、行权价（或平值档位）和方向相同的组合会显示收盘贴水差值分布
 """)
@@ -0,0 +1,36 @@
+"""
+原子文件写入
+Atomic File Writes
+
+先写目标目录下各自独立的临时文件，再用 os.replace 原子替换：
+读取方不会读到写了一半的文件，多个进程同时写同一路径时也不会互相覆盖临时文件。
+"""
+
+import json
+import os
+import tempfile
+
+
+def write_atomic(path, write, binary=False):
+    """调用 write(f) 写入临时文件后原子替换path，目录不存在时创建；失败时删除临时文件并抛出异常"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_text_atomic(path, text):
+    """原子写入文本"""
+    write_atomic(path, lambda f: f.write(text))
+
+
+def write_json_atomic(path, payload):
+    """原子写入JSON"""
+    write_atomic(path, lambda f: json.dump(payload, f, ensure_ascii=False))
@@ -0,0 +1,183 @@
+"""
+贴水数据导出接口
+Premium Export API
+
+在Streamlit进程内启动一个本地HTTP服务，直接读取进程内的最新贴水快照，
+不会为每个客户端触发新的上游请求：
+- GET /snapshot?pairs=a,b   最新快照（JSON），pairs为空时返回全部组合
+- GET /stream?pairs=a,b     持续推送更新（JSON Lines，每行一条）
+- GET /pairs                当前可订阅的组合键列表
+
+每条快照附带 age_seconds（距页面上次写入的秒数），超过 SNAPSHOT_STALE_SECONDS 未更新时
+stale 为 true，超过 SNAPSHOT_EVICT_SECONDS 未更新的组合会被移除。
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EXPORT_HOST = os.environ.get("PREMIUM_EXPORT_HOST", "127.0.0.1")
+EXPORT_PORT = int(os.environ.get("PREMIUM_EXPORT_PORT", "8765"))
+
+# 推送流无更新时发送心跳空行的间隔（秒）
+STREAM_HEARTBEAT_SECONDS = 15.0
+# 快照超过该时间未更新时标记为过期（页面已关闭或停止刷新）
+SNAPSHOT_STALE_SECONDS = 30.0
+# 快照超过该时间未更新时从存储中移除
+SNAPSHOT_EVICT_SECONDS = 3600.0
+
+
+class PremiumSnapshotStore:
+    """进程内最新贴水快照，页面每次刷新后写入，导出接口只读"""
+
+    def __init__(self, stale_seconds=SNAPSHOT_STALE_SECONDS, evict_seconds=SNAPSHOT_EVICT_SECONDS):
+        self.condition = threading.Condition()
+        self.snapshots = {}
+        self.published = {}
+        self.version = 0
+        self.stale_seconds = stale_seconds
+        self.evict_seconds = evict_seconds
+
+    def _evict_expired(self, now):
+        # 调用方需持有锁
+        for pair in [pair for pair, published in self.published.items() if now - published > self.evict_seconds]:
+            del self.snapshots[pair]
+            del self.published[pair]
+
+    def _with_age(self, pair, now):
+        """附加距上次写入的秒数，超过期限的快照标记为过期"""
+        snapshot = self.snapshots[pair]
+        age = now - self.published[pair]
+        return dict(
+            snapshot,
+            age_seconds=round(age, 3),
+            stale=bool(snapshot.get('stale')) or age > self.stale_seconds
+        )
+
+    def publish(self, pair_key, payload):
+        """写入某个组合的最新快照并唤醒所有推送流"""
+        with self.condition:
+            now = time.time()
+            self._evict_expired(now)
+            self.version += 1
+            self.snapshots[pair_key] = dict(payload, pair_key=pair_key, version=self.version)
+            self.published[pair_key] = now
+            self.condition.notify_all()
+
+    def latest(self, pairs=None):
+        """最新快照，pairs为空时返回全部"""
+        with self.condition:
+            now = time.time()
+            self._evict_expired(now)
+            return {
+                pair: self._with_age(pair, now)
+                for pair in (pairs or list(self.snapshots)) if pair in self.snapshots
+            }
+
+    def wait_for_updates(self, since_version, pairs=None, timeout=None):
+        """阻塞等待版本号大于since_version的更新，返回 (当前版本, 更新列表)"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version > since_version, timeout=timeout)
+            now = time.time()
+            self._evict_expired(now)
+            updates = [
+                self._with_age(pair, now) for pair, snapshot in self.snapshots.items()
+                if snapshot['version'] > since_version and (not pairs or pair in pairs)
+            ]
+            return self.version, sorted(updates, key=lambda snapshot: snapshot['version'])
+
+
+_store = PremiumSnapshotStore()
+
+
+def get_snapshot_store():
+    """进程内共享的快照存储"""
+    return _store
+
+
+def _parse_pairs(query):
+    pairs = []
+    for value in query.get('pairs', []):
+        pairs.extend(pair for pair in value.split(',') if pair)
+    return pairs
+
+
+class ExportRequestHandler(BaseHTTPRequestHandler):
+    """导出接口请求处理"""
+
+    def log_message(self, format, *args):
+        # 不向控制台输出每个请求
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        pairs = _parse_pairs(parse_qs(url.query))
+
+        if url.path == '/snapshot':
+            self._send_json(_store.latest(pairs))
+        elif url.path == '/pairs':
+            self._send_json(sorted(_store.latest().keys()))
+        elif url.path == '/stream':
+            self._stream(pairs)
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def _stream(self, pairs):
+        """先推送当前快照，之后每有更新推送一行"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        version = 0
+        # 心跳按最近一次写给该客户端的时间计算：其他组合的更新也会唤醒等待，不能每次唤醒都重新计时
+        last_write = time.monotonic()
+        try:
+            while True:
+                timeout = max(STREAM_HEARTBEAT_SECONDS - (time.monotonic() - last_write), 0)
+                version, updates = _store.wait_for_updates(version, pairs, timeout=timeout)
+                if updates:
+                    lines = ''.join(
+                        json.dumps(update, ensure_ascii=False, separators=(',', ':')) + '\n'
+                        for update in updates
+                    )
+                    self.wfile.write(lines.encode('utf-8'))
+                elif time.monotonic() - last_write >= STREAM_HEARTBEAT_SECONDS:
+                    self.wfile.write(b'\n')
+                else:
+                    continue
+                self.wfile.flush()
+                last_write = time.monotonic()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def is_port_available(host=EXPORT_HOST, port=EXPORT_PORT):
+    """导出端口当前是否可以绑定"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.bind((host, port))
+    except OSError:
+        return False
+    return True
+
+
+def start_export_server(host=EXPORT_HOST, port=EXPORT_PORT):
+    """在后台线程启动导出服务，返回server对象"""
+    server = ThreadingHTTPServer((host, port), ExportRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="premium-export-api", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,235 @@
+"""
+行情数据层
+Market Data Layer
+
+封装对akshare行情接口的调用（统一经过 upstream_client 的限速、重试和熔断），
+供Streamlit页面和独立的行情采集进程共用。
+"""
+
+import time
+
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from upstream_client import UpstreamError, call_ak
+
+# 标的ETF配置：行情代码 -> 名称和匹配关键词
+ETF_CONFIG = {
+    "sh510300": {"name": "300ETF", "keywords": ["沪深300", "300ETF"]},
+    "sh510500": {"name": "500ETF", "keywords": ["中证500", "500ETF"]},
+    "sh510050": {"name": "50ETF", "keywords": ["上证50", "50ETF"]},
+    "sh588000": {"name": "科创50ETF", "keywords": ["华夏科创50", "科创50ETF"]},
+    "sh588080": {"name": "科创板50ETF", "keywords": ["易方达科创50", "科创板50ETF", "易方达"]}
+}
+
+# 同一快照内各报价接收时间的最大允许差（秒）
+MAX_SNAPSHOT_SKEW = 1.0
+# 超出时间窗口的报价最多重新获取的轮数
+MAX_REALIGN_ROUNDS = 2
+# 报价接收后超过该时间（秒）视为旧数据，如行情采集进程已停止
+MAX_QUOTE_AGE = 10.0
+
+# 期权合约交易代码第12位：M为标准合约，A为分红除息后调整过行权价和合约单位的合约
+def is_standard_contract(contract_codes):
+    """逐个判断合约交易代码（Series）是否为标准合约"""
+    return contract_codes.str[11] == 'M'
+
+# 期权合约交易代码前6位即标的ETF代码
+def get_underlying_symbol(contract_code):
+    """根据期权合约交易代码获取标的ETF行情代码，如 510300C2412M04000 -> sh510300"""
+    return f"sh{contract_code[:6]}"
+
+# 从"字段/值"格式的行情表中读取某个字段
+def get_field_value(quote_df, field_name):
+    """读取字段值并转换为float，缺失或无法解析时返回0.0"""
+    try:
+        return float(quote_df[quote_df['字段'] == field_name]['值'].iloc[0])
+    except (IndexError, KeyError, ValueError, TypeError):
+        return 0.0
+
+# 从"字段/值"格式的行情表中读取文本字段
+def get_field_text(quote_df, field_name):
+    """读取字段的原始文本，缺失时返回空字符串"""
+    try:
+        return str(quote_df[quote_df['字段'] == field_name]['值'].iloc[0]).strip()
+    except (IndexError, KeyError):
+        return ''
+
+# 获取期权买一卖一价格
+def get_option_bid_ask_price(security_id):
+    """获取期权的买一价和卖一价；上游失败时回退到最近一次成功报价并标记stale"""
+    try:
+        response = call_ak(
+            'option_sse_spot_price_sina',
+            validate=lambda df: get_field_value(df, '最新价') > 0 or get_field_value(df, '买价') > 0,
+            symbol=security_id
+        )
+        option_data = response.data
+        
+        # 获取买一价、卖一价，最新价作为参考
+        bid_price = get_field_value(option_data, '买价')
+        ask_price = get_field_value(option_data, '卖价')
+        last_price = get_field_value(option_data, '最新价')
+        
+        price_data = {
+            'bid_price': round(bid_price, 4) if bid_price > 0 else 0.0,
+            'ask_price': round(ask_price, 4) if ask_price > 0 else 0.0,
+            'last_price': round(last_price, 4) if last_price > 0 else 0.0,
+            'updated': response.fetched_at,
+            'quote_time': get_field_text(option_data, '行情时间')
+        }
+        if response.stale:
+            price_data['stale'] = True
+        return price_data
+        
+    except UpstreamError as e:
+        return {
+            'bid_price': 0.0,
+            'ask_price': 0.0,
+            'last_price': 0.0,
+            'error': str(e)
+        }
+
+# 获取单个ETF实时报价
+def get_etf_quote(symbol):
+    """获取单个ETF价格及其获取时间，上游失败时回退到最近一次成功价格并标记stale"""
+    try:
+        response = call_ak(
+            'option_sse_underlying_spot_price_sina',
+            validate=lambda df: get_field_value(df, '最近成交价') > 0,
+            symbol=symbol
+        )
+        return {
+            'price': round(get_field_value(response.data, '最近成交价'), 4),  # 保留4位小数
+            'updated': response.fetched_at,
+            'quote_time': f"{get_field_text(response.data, '行情日期')} {get_field_text(response.data, '行情时间')}".strip(),
+            'stale': response.stale
+        }
+    except UpstreamError as e:
+        return {'price': 0.0, 'updated': None, 'stale': True, 'error': str(e)}
+
+# 获取实时ETF报价（不缓存，每次都获取最新价格）
+def get_real_time_etf_quotes(symbols=None):
+    """并行获取多个ETF的实时报价，symbols为空时获取全部ETF"""
+    symbols = list(symbols or ETF_CONFIG.keys())
+    with ThreadPoolExecutor(max_workers=max(len(symbols), 1)) as executor:
+        return dict(zip(symbols, executor.map(get_etf_quote, symbols)))
+
+# 批量获取期权报价
+def get_option_quotes_batch(security_ids, max_workers=16):
+    """并行获取一批期权的买一卖一价，按security_id去重，返回 {security_id: 报价}"""
+    security_ids = list(dict.fromkeys(security_ids))
+    if not security_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(security_ids))) as executor:
+        return dict(zip(security_ids, executor.map(get_option_bid_ask_price, security_ids)))
+
+# 衡量一组报价的时间对齐程度
+def measure_skew(quotes, max_skew=MAX_SNAPSHOT_SKEW):
+    """返回 (最早与最晚接收时间之差, 落后于最新报价超过max_skew的键列表)
+
+    以本地接收时间衡量：交易所行情时间只有秒级精度，且不活跃合约的行情时间会停留在最后一次变动，
+    不能说明报价是否为同一时刻获取。报错的报价不参与衡量（已单独标记）。
+    """
+    received = {key: quote.get('updated') for key, quote in quotes.items() if 'error' not in quote}
+    known = [updated for updated in received.values() if updated is not None]
+    if not known:
+        return None, [key for key, updated in received.items() if updated is None]
+    newest = max(known)
+    lagging = [
+        key for key, updated in received.items()
+        if updated is None or newest - updated > max_skew
+    ]
+    return newest - min(known), lagging
+
+# 一组报价中最旧的报价距今多久
+def measure_age(quotes, now=None):
+    """返回最早接收时间距今的秒数，报错的报价不参与；没有可衡量的报价时返回None"""
+    received = [
+        quote.get('updated') for quote in quotes.values()
+        if 'error' not in quote and quote.get('updated') is not None
+    ]
+    if not received:
+        return None
+    return (time.time() if now is None else now) - min(received)
+
+# 在同一时间窗口内获取标的和期权报价
+def get_aligned_quotes(etf_symbols, security_ids, max_skew=MAX_SNAPSHOT_SKEW, max_rounds=MAX_REALIGN_ROUNDS):
+    """标的价格和所有期权报价作为同一批并发请求发出；接收时间相差超过max_skew时，
+    重新获取落后的报价（最多max_rounds轮）。
+
+    返回 {'etf_quotes', 'quotes', 'skew', 'misaligned'}，misaligned为重新获取后仍不在时间窗口内的
+    标的代码或security_id，调用方应将该快照视为不可靠。
+    """
+    fetchers = {'etf': get_etf_quote, 'option': get_option_bid_ask_price}
+    keys = [('etf', symbol) for symbol in dict.fromkeys(etf_symbols)]
+    keys += [('option', security_id) for security_id in dict.fromkeys(security_ids)]
+    if not keys:
+        return {'etf_quotes': {}, 'quotes': {}, 'skew': None, 'misaligned': []}
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+        def fetch(batch):
+            return dict(zip(batch, executor.map(lambda key: fetchers[key[0]](key[1]), batch)))
+
+        quotes = fetch(keys)
+        skew, lagging = measure_skew(quotes, max_skew)
+        for _ in range(max_rounds):
+            if not lagging:
+                break
+            quotes.update(fetch(lagging))
+            skew, lagging = measure_skew(quotes, max_skew)
+
+    return {
+        'etf_quotes': {symbol: quote for (kind, symbol), quote in quotes.items() if kind == 'etf'},
+        'quotes': {security_id: quote for (kind, security_id), quote in quotes.items() if kind == 'option'},
+        'skew': skew,
+        'misaligned': [key for _, key in lagging]
+    }
+
+# 根据ETF类型获取对应的ETF行情代码
+def get_etf_symbol_for_type(etf_type_name, etf_config=ETF_CONFIG):
+    """根据ETF类型名称获取对应的ETF行情代码"""
+    # 创建所有可能的匹配项，按关键词长度降序排列
+    matches = []
+    for symbol, config in etf_config.items():
+        for keyword in config['keywords']:
+            if keyword in etf_type_name:
+                matches.append((len(keyword), symbol, keyword))
+    
+    # 按关键词长度降序排序，优先匹配更具体的关键词
+    matches.sort(reverse=True)
+    
+    if matches:
+        return matches[0][1]
+    
+    # 默认返回300ETF
+    return "sh510300"
+
+# 获取整条期权链最新价（每个合约月份一次调用即可拿到全部行权价）
+def get_option_chain_quotes(etf_symbol, months):
+    """并行获取指定ETF各合约月份全部行权价的最新价"""
+    def fetch_month(month):
+        chain = call_ak('option_finance_board', symbol=etf_symbol, end_month=month).data
+        if chain.empty:
+            return None
+        # 数量为当日成交量，用于排除当日没有成交、当前价停留在旧价的合约
+        columns = ['合约交易代码', '行权价', '当前价'] + [column for column in ['数量'] if column in chain.columns]
+        chain = chain[columns].copy()
+        chain['合约月份'] = chain['合约交易代码'].str[7:11]
+        chain['期权类型'] = chain['合约交易代码'].str[6]
+        return chain
+
+    chains = []
+    with ThreadPoolExecutor(max_workers=max(len(months), 1)) as executor:
+        futures = [executor.submit(fetch_month, month) for month in months]
+        for future in as_completed(futures):
+            try:
+                chain = future.result()
+                if chain is not None:
+                    chains.append(chain)
+            except Exception as e:
+                continue
+
+    if not chains:
+        return pd.DataFrame()
+    return pd.concat(chains, ignore_index=True)
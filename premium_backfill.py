@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+贴水历史回填
+Premium Backfill
+
+用交易所日频数据重建指定合约组合过去若干个月的每日收盘贴水，写入 data/premium_daily：
+1. 每个交易日挂牌的合约列表（option_risk_indicator_sse，按日期并行获取）
+2. 按组合配置逐日选出四条腿，获取这些合约的全部日线（option_sse_daily_sina，每个合约一次调用）
+3. 标的ETF日线（fund_etf_hist_sina），用收盘价计算时间价值和贴水
+
+每个交易日的合约列表和每个合约的日线都单独保存在 data/backfill 下作为检查点，
+中断后重新运行只获取缺少的部分。历史数据没有买一卖一价，四条腿统一使用收盘价。
+
+组合配置格式: ETF名称,月份,行权价,方向,月份,行权价,方向
+- 月份: 合约月份如 2612，或 M0/M1/...（当日挂牌的第1/2/...个合约月份）
+- 行权价: 固定行权价如 4.0，或 ATM+0/ATM-1（按当日标的收盘价选取）
+与页面中相同配置的组合使用相同的存储键，页面会显示回填的收盘贴水差值分布；
+页面所选的具体月份没有回填时，按其在当前挂牌月份中的位置查找 M0/M1/... 组合的回填。
+结束日期取不晚于 --end 的最后一个已收盘交易日。
+
+示例：
+    python premium_backfill.py                                   # 全部ETF的当月平值 vs 次月平值，近6个月
+    python premium_backfill.py --months 12 --workers 8
+    python premium_backfill.py --pair 300ETF,M0,ATM+0,Buy,M1,ATM+0,Buy --pair 50ETF,2612,3.0,Buy,2703,3.0,Sell
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from market_data import ETF_CONFIG
+from premium_calc import calculate_premium_value, calculate_time_value, resolve_atm_strike
+from premium_history import DATA_DIR, make_pair_key, save_daily_premiums, write_parquet_atomic
+from trading_calendar import get_trading_calendar
+from upstream_client import call_ak
+
+BACKFILL_DIR = os.path.join(DATA_DIR, "backfill")
+LISTINGS_DIR = os.path.join(BACKFILL_DIR, "listings")
+OPTION_DAILY_DIR = os.path.join(BACKFILL_DIR, "option_daily")
+
+BEIJING_TZ = datetime.timezone(datetime.timedelta(hours=8))
+# 收盘后交易所日线才完整
+MARKET_CLOSE = datetime.time(15, 30)
+
+_MONTH_PATTERN = re.compile(r"^(M(\d)|\d{4})$")
+_ATM_PATTERN = re.compile(r"^ATM([+-]\d+)$")
+
+
+def parse_pair(spec):
+    """解析组合配置，返回 {'etf_name', 'symbol', 'legs', 'pair_key'}；格式错误时抛出ValueError"""
+    parts = [part.strip() for part in spec.split(",")]
+    if len(parts) != 7:
+        raise ValueError(f"组合配置应为7项: {spec}")
+
+    symbols = {config['name']: symbol for symbol, config in ETF_CONFIG.items()}
+    etf_name = parts[0]
+    if etf_name not in symbols:
+        raise ValueError(f"未知的ETF名称 {etf_name}，可选: {', '.join(symbols)}")
+
+    legs = []
+    for month, strike, direction in (parts[1:4], parts[4:7]):
+        month_match = _MONTH_PATTERN.match(month)
+        if not month_match:
+            raise ValueError(f"无效的合约月份 {month}")
+        atm_match = _ATM_PATTERN.match(strike)
+        if atm_match:
+            strike_value = ('atm', int(atm_match.group(1)))
+        else:
+            try:
+                strike_value = ('fixed', round(float(strike), 4))
+            except ValueError:
+                raise ValueError(f"无效的行权价 {strike}")
+        if direction not in ("Buy", "Sell"):
+            raise ValueError(f"无效的交易方向 {direction}")
+        legs.append({
+            'month': ('relative', int(month_match.group(2))) if month_match.group(2) else ('fixed', month),
+            'strike': strike_value,
+            'label': (month, strike if atm_match else strike_value[1], direction)
+        })
+
+    return {
+        'etf_name': etf_name,
+        'symbol': symbols[etf_name],
+        'legs': legs,
+        'pair_key': make_pair_key(etf_name, legs[0]['label'], legs[1]['label'])
+    }
+
+
+def default_pairs():
+    """默认组合：每个ETF的当月平值 vs 次月平值"""
+    return [
+        parse_pair(f"{config['name']},M0,ATM+0,Buy,M1,ATM+0,Buy")
+        for config in ETF_CONFIG.values()
+    ]
+
+
+def last_closed_trading_day(calendar, end, now=None):
+    """不晚于end的最后一个已收盘交易日：end为非交易日取其前一交易日，为今天且未收盘时取上一交易日"""
+    now = now or datetime.datetime.now(BEIJING_TZ)
+    day = end if calendar.is_trading_day(end) else calendar.previous_trading_day(end)
+    if day is not None and day >= now.date() and now.time() < MARKET_CLOSE:
+        day = calendar.previous_trading_day(now.date())
+    return day
+
+
+def get_backfill_dates(calendar, start, end):
+    """start到end（含）之间的交易日，按时间排序"""
+    dates = []
+    date = start
+    while date <= end:
+        if calendar.is_trading_day(date):
+            dates.append(date)
+        date += datetime.timedelta(days=1)
+    return dates
+
+
+def _listing_file(date):
+    return os.path.join(LISTINGS_DIR, f"{date.strftime('%Y-%m-%d')}.parquet")
+
+
+def fetch_listing(date):
+    """获取某个交易日挂牌的全部合约（CONTRACT_ID, SECURITY_ID），写入检查点"""
+    listing = call_ak('option_risk_indicator_sse', date=date.strftime("%Y%m%d")).data
+    if listing.empty:
+        return listing
+    listing = listing[['CONTRACT_ID', 'SECURITY_ID']].astype(str)
+    write_parquet_atomic(listing, _listing_file(date))
+    return listing
+
+
+def _option_daily_file(security_id):
+    return os.path.join(OPTION_DAILY_DIR, f"{security_id}.parquet")
+
+
+def fetch_option_daily(security_id):
+    """获取单个合约的全部日线收盘价，写入检查点"""
+    daily = call_ak('option_sse_daily_sina', symbol=security_id).data
+    daily = pd.DataFrame({'date': daily['日期'], 'close': daily['收盘']})
+    write_parquet_atomic(daily, _option_daily_file(security_id))
+    return daily
+
+
+def fetch_etf_closes(symbol):
+    """标的ETF每日收盘价，返回 {日期: 收盘价}"""
+    daily = call_ak('fund_etf_hist_sina', symbol=symbol).data
+    return dict(zip(daily['date'], daily['close']))
+
+
+def run_parallel(tasks, workers, description):
+    """用有界线程池执行 {键: 无参函数}，返回 (结果dict, 失败键列表)，并打印进度"""
+    results = {}
+    failed = []
+    if not tasks:
+        return results, failed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(task): key for key, task in tasks.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                failed.append(key)
+                print(f"❌ {description} {key} 获取失败: {str(e)}")
+            if done % 20 == 0 or done == len(futures):
+                print(f"   {description}: {done}/{len(futures)}")
+    return results, failed
+
+
+def load_listings(dates, workers):
+    """读取各交易日的合约列表，缺少检查点的日期并行获取"""
+    listings = {}
+    tasks = {}
+    for date in dates:
+        path = _listing_file(date)
+        if os.path.exists(path):
+            try:
+                listings[date] = pd.read_parquet(path)
+                continue
+            except Exception as e:
+                print(f"⚠️ 合约列表检查点 {date} 无法读取，重新获取: {str(e)}")
+        tasks[date] = lambda date=date: fetch_listing(date)
+
+    print(f"📅 合约列表: {len(listings)} 个交易日已有检查点，需获取 {len(tasks)} 个")
+    fetched, failed = run_parallel(tasks, workers, "合约列表")
+    listings.update({date: listing for date, listing in fetched.items() if not listing.empty})
+    return listings, failed
+
+
+def parse_listing(listing, symbol):
+    """某个标的的标准合约（不含分红调整后的A合约）：月份、类型、行权价和security_id"""
+    code = symbol[2:]
+    contracts = listing[
+        listing['CONTRACT_ID'].str.startswith(code) & (listing['CONTRACT_ID'].str[11] == 'M')
+    ]
+    return pd.DataFrame({
+        'month': contracts['CONTRACT_ID'].str[7:11],
+        'type': contracts['CONTRACT_ID'].str[6],
+        'strike': (contracts['CONTRACT_ID'].str[12:].astype(int) / 1000).round(4),
+        'security_id': contracts['SECURITY_ID']
+    })
+
+
+def resolve_leg(contracts, etf_close, leg):
+    """按组合配置在当日挂牌合约中选出一组Call和Put，返回 (月份, 行权价, call_id, put_id) 或None"""
+    months = sorted(contracts['month'].unique())
+    kind, value = leg['month']
+    if kind == 'relative':
+        if value >= len(months):
+            return None
+        month = months[value]
+    elif value in months:
+        month = value
+    else:
+        return None
+
+    # 只考虑Call和Put都挂牌的行权价
+    month_contracts = contracts[contracts['month'] == month].pivot_table(
+        index='strike', columns='type', values='security_id', aggfunc='first'
+    )
+    if 'C' not in month_contracts.columns or 'P' not in month_contracts.columns:
+        return None
+    month_contracts = month_contracts.dropna(subset=['C', 'P'])
+    strikes = month_contracts.index.tolist()
+
+    kind, value = leg['strike']
+    strike = resolve_atm_strike(strikes, etf_close, value) if kind == 'atm' else value
+    if strike not in month_contracts.index:
+        return None
+    return month, strike, month_contracts.at[strike, 'C'], month_contracts.at[strike, 'P']
+
+
+def calculate_close_premium(etf_close, strike, call_close, put_close):
+    """用收盘价计算单组贴水值"""
+    call_time_value = calculate_time_value(call_close, etf_close, strike, 'CALL')
+    put_time_value = calculate_time_value(put_close, etf_close, strike, 'PUT')
+    return calculate_premium_value(call_time_value, put_time_value)
+
+
+def main():
+    """运行历史回填"""
+    parser = argparse.ArgumentParser(description="贴水历史回填")
+    parser.add_argument("--pair", action="append", default=None,
+                        help="组合配置，可重复指定，格式: ETF名称,月份,行权价,方向,月份,行权价,方向")
+    parser.add_argument("--months", type=float, default=6, help="回填最近几个月，默认6")
+    parser.add_argument("--end", default=None, help="结束日期 YYYY-MM-DD，默认今天")
+    parser.add_argument("--workers", type=int, default=8, help="并行请求线程数")
+    args = parser.parse_args()
+
+    try:
+        pairs = [parse_pair(spec) for spec in args.pair] if args.pair else default_pairs()
+        end = datetime.datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else datetime.date.today()
+    except ValueError as e:
+        print(f"错误：{str(e)}")
+        sys.exit(1)
+
+    calendar = get_trading_calendar()
+    missing_years = calendar.missing_holiday_years()
+    if missing_years:
+        print(f"⚠️ holidays.txt 缺少 {'、'.join(map(str, missing_years))} 年的休市安排，这些年份的交易日只排除了周末")
+    end = last_closed_trading_day(calendar, end)
+    if end is None:
+        print("错误：结束日期超出交易日历范围")
+        sys.exit(1)
+    start = end - datetime.timedelta(days=round(args.months * 30.44))
+    dates = get_backfill_dates(calendar, start, end)
+    print(f"🚀 回填 {len(pairs)} 个组合，{start} ~ {end} 共 {len(dates)} 个交易日\n")
+
+    # 1. 各交易日挂牌的合约列表
+    listings, failed_dates = load_listings(dates, args.workers)
+
+    # 2. 标的ETF日线
+    symbols = sorted({pair['symbol'] for pair in pairs})
+    etf_closes, _ = run_parallel(
+        {symbol: lambda symbol=symbol: fetch_etf_closes(symbol) for symbol in symbols},
+        args.workers, "标的日线"
+    )
+
+    # 3. 逐日选出每个组合的四条腿
+    legs_by_pair = {}
+    needed = {}
+    for pair in pairs:
+        closes = etf_closes.get(pair['symbol'], {})
+        rows = []
+        for date in sorted(listings):
+            etf_close = closes.get(date, 0.0)
+            if etf_close <= 0:
+                continue
+            contracts = parse_listing(listings[date], pair['symbol'])
+            resolved = [resolve_leg(contracts, etf_close, leg) for leg in pair['legs']]
+            if None in resolved:
+                continue
+            rows.append((date, etf_close, resolved))
+            for month, _, call_id, put_id in resolved:
+                needed[call_id] = month
+                needed[put_id] = month
+        legs_by_pair[pair['pair_key']] = rows
+
+    # 4. 所需合约的日线；已到期或已覆盖到结束日期的检查点直接使用
+    option_closes = {}
+    tasks = {}
+    for security_id, month in needed.items():
+        path = _option_daily_file(security_id)
+        if os.path.exists(path):
+            try:
+                daily = pd.read_parquet(path)
+            except Exception as e:
+                print(f"⚠️ 合约日线检查点 {security_id} 无法读取，重新获取: {str(e)}")
+                daily = pd.DataFrame()
+            expiry = calendar.expiry_date(month)
+            if not daily.empty and (daily['date'].max() >= end or (expiry is not None and expiry < end)):
+                option_closes[security_id] = daily
+                continue
+        tasks[security_id] = lambda security_id=security_id: fetch_option_daily(security_id)
+
+    print(f"📈 合约日线: {len(option_closes)} 个合约已有检查点，需获取 {len(tasks)} 个")
+    fetched, failed_contracts = run_parallel(tasks, args.workers, "合约日线")
+    option_closes.update(fetched)
+    option_closes = {
+        security_id: dict(zip(daily['date'], daily['close']))
+        for security_id, daily in option_closes.items()
+    }
+
+    # 5. 计算每日收盘贴水并写入列式存储
+    print()
+    for pair in pairs:
+        records = []
+        for date, etf_close, resolved in legs_by_pair[pair['pair_key']]:
+            premiums = []
+            for month, strike, call_id, put_id in resolved:
+                call_close = option_closes.get(call_id, {}).get(date, 0.0)
+                put_close = option_closes.get(put_id, {}).get(date, 0.0)
+                if not call_close > 0 or not put_close > 0:
+                    break
+                premiums.append(calculate_close_premium(etf_close, strike, call_close, put_close))
+            if len(premiums) != 2:
+                continue
+            records.append({
+                'date': date,
+                'etf_close': etf_close,
+                'month1': resolved[0][0],
+                'strike1': resolved[0][1],
+                'month2': resolved[1][0],
+                'strike2': resolved[1][1],
+                'group1_premium': premiums[0],
+                'group2_premium': premiums[1],
+                'diff': premiums[1] - premiums[0]
+            })
+
+        if not records:
+            print(f"⚠️ {pair['pair_key']}: 没有可用数据")
+            continue
+        daily = pd.DataFrame(records)
+        save_daily_premiums(pair['pair_key'], daily)
+        print(
+            f"✅ {pair['pair_key']}: {len(daily)} 个交易日，"
+            f"贴水差值 最大 {daily['diff'].max():.4f} 最小 {daily['diff'].min():.4f}"
+        )
+
+    if failed_dates or failed_contracts:
+        print(f"\n⚠️ {len(failed_dates)} 个交易日、{len(failed_contracts)} 个合约获取失败，重新运行将只补取这些部分")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+贴水计算
+Premium Calculation
+
+时间价值、贴水值和平值行权价的计算，以及全品种平值贴水和隐含远期拟合，供界面、历史回填等共用。
+"""
+
+import bisect
+import time
+
+import pandas as pd
+
+from market_data import MAX_QUOTE_AGE, get_etf_symbol_for_type, is_standard_contract
+
+
+# 计算时间价值
+def calculate_time_value(option_price, etf_price, strike_price, option_type):
+    """计算期权的时间价值：时间价值 = 交易价格 - 内在价值"""
+    if option_type.upper() == 'CALL' or option_type.upper() == 'C':
+        # Call期权内在价值 = max(标的价格 - 行权价, 0)
+        intrinsic_value = max(etf_price - strike_price, 0)
+    else:
+        # Put期权内在价值 = max(行权价 - 标的价格, 0)
+        intrinsic_value = max(strike_price - etf_price, 0)
+    
+    # 时间价值 = 交易价格 - 内在价值（可以为负数）
+    time_value = option_price - intrinsic_value
+    return time_value
+
+
+# 计算贴水值
+def calculate_premium_value(call_time_value, put_time_value):
+    """计算贴水值：Put时间价值 - Call时间价值"""
+    return put_time_value - call_time_value
+
+
+# 按标的价格解析平值±k档行权价
+def resolve_atm_strike(sorted_strikes, etf_price, offset):
+    """在已排序的行权价中二分查找最接近标的价格的平值行权价，再偏移offset档"""
+    if not sorted_strikes:
+        return None
+    if etf_price <= 0:
+        # 标的价格不可用时以行权价梯队中间档近似平值
+        index = len(sorted_strikes) // 2
+    else:
+        index = bisect.bisect_left(sorted_strikes, etf_price)
+        if index == len(sorted_strikes):
+            index -= 1
+        elif index > 0 and etf_price - sorted_strikes[index - 1] <= sorted_strikes[index] - etf_price:
+            index -= 1
+    return sorted_strikes[min(max(index + offset, 0), len(sorted_strikes) - 1)]
+
+
+# 基于看涨看跌平价拟合隐含远期和合成基差
+def calculate_implied_forwards(chain_df, etf_price):
+    """对每个合约月份当日有成交的行权价回归 C - P = D·F - D·K，一次向量化求出隐含远期F和贴现因子D"""
+    if chain_df is None or chain_df.empty:
+        return pd.DataFrame()
+
+    # 当日没有成交的合约，当前价是之前交易日的旧价，与实时标的价格不同步，不参与拟合
+    if '数量' in chain_df.columns:
+        chain_df = chain_df[pd.to_numeric(chain_df['数量'], errors='coerce') > 0]
+        if chain_df.empty:
+            return pd.DataFrame()
+
+    # 按 (月份, 行权价) 对齐Call和Put价格，只保留Call和Put当日都有成交的行权价
+    pairs = chain_df.pivot_table(
+        index=['合约月份', '行权价'],
+        columns='期权类型',
+        values='当前价',
+        aggfunc='mean'
+    )
+    if 'C' not in pairs.columns or 'P' not in pairs.columns:
+        return pd.DataFrame()
+    pairs = pairs[(pairs['C'] > 0) & (pairs['P'] > 0)].reset_index()
+    if pairs.empty:
+        return pd.DataFrame()
+
+    # 所有月份的最小二乘回归一次性用分组求和完成
+    k = pairs['行权价'].astype(float)
+    y = pairs['C'] - pairs['P']
+    sums = pd.DataFrame({
+        '合约月份': pairs['合约月份'],
+        'n': 1,
+        'k': k,
+        'y': y,
+        'kk': k * k,
+        'ky': k * y
+    }).groupby('合约月份').sum()
+
+    n = sums['n']
+    var_k = sums['kk'] - sums['k'] ** 2 / n
+    cov_ky = sums['ky'] - sums['k'] * sums['y'] / n
+    slope = cov_ky / var_k
+    intercept = (sums['y'] - slope * sums['k']) / n
+
+    discount = -slope
+    forward = intercept / discount
+
+    # 标的价格不可用（获取失败时为0）时基差无意义
+    basis = forward - etf_price if etf_price > 0 else float('nan')
+    curve = pd.DataFrame({
+        '有效行权价数': n.astype(int),
+        '贴现因子': discount,
+        '隐含远期': forward,
+        '合成基差': basis,
+        '基差率': basis / etf_price if etf_price > 0 else float('nan')
+    })
+    # 至少需要两个不同行权价、且贴现因子为正，拟合才有意义
+    curve = curve[(n >= 2) & (var_k > 0) & (discount > 0)]
+    return curve.sort_index()
+
+
+
+# 为每个ETF和合约月份选出平值行权价的Call/Put合约
+def select_atm_legs(option_data, option_mapping, etf_prices):
+    """按各ETF现价选取距离最近、且Call和Put都存在的行权价，一次向量化完成。
+
+    只在标准合约中选取：分红调整合约的行权价和价格与标准合约不可比，也不能跨品种比较。
+    """
+    option_data = option_data[is_standard_contract(option_data['合约交易代码'])]
+    chain = pd.DataFrame({
+        'ETF类型': option_data['ETF类型'].astype(str),
+        '合约月份': option_data['合约月份'].astype(str),
+        '行权价': option_data['行权价'].astype('float64').round(4),
+        '期权类型': option_data['合约交易代码'].str[6],
+        '合约交易代码': option_data['合约交易代码']
+    })
+
+    pairs = chain.pivot_table(
+        index=['ETF类型', '合约月份', '行权价'],
+        columns='期权类型',
+        values='合约交易代码',
+        aggfunc='first'
+    )
+    if 'C' not in pairs.columns or 'P' not in pairs.columns:
+        return pd.DataFrame()
+    pairs = pairs.dropna(subset=['C', 'P']).reset_index()
+
+    # 标的价格不可用的ETF跳过
+    etf_symbols = {etf_type: get_etf_symbol_for_type(etf_type) for etf_type in pairs['ETF类型'].unique()}
+    pairs['标的价格'] = pairs['ETF类型'].map(etf_symbols).map(etf_prices).fillna(0.0)
+    pairs = pairs[pairs['标的价格'] > 0]
+    if pairs.empty:
+        return pd.DataFrame()
+
+    pairs['距离'] = (pairs['行权价'] - pairs['标的价格']).abs()
+    atm = pairs.loc[pairs.groupby(['ETF类型', '合约月份'])['距离'].idxmin()].copy()
+
+    def to_security_id(code):
+        return option_mapping[code]['security_id'] if code in option_mapping else None
+    atm['call_security_id'] = atm['C'].map(to_security_id)
+    atm['put_security_id'] = atm['P'].map(to_security_id)
+    return atm.rename(columns={'C': 'call_code', 'P': 'put_code'}).drop(columns='距离').reset_index(drop=True)
+
+
+
+# 计算各ETF各月份平值贴水，并按标的价格归一化
+def calculate_atm_premium_grid(atm_legs, leg_quotes, etf_quotes=None):
+    """平值贴水 = Put时间价值 - Call时间价值（取买卖中间价），除以标的价格以便跨品种比较。
+
+    报错的腿不参与计算（贴水为NaN）；任一条腿或标的是上游失败时回退的旧报价、
+    或获取时间早于 MAX_QUOTE_AGE 秒前，则该行'过期'为True。
+    """
+    if atm_legs is None or atm_legs.empty:
+        return pd.DataFrame()
+    now = time.time()
+
+    def is_outdated(quote):
+        if not quote:
+            return False
+        updated = quote.get('updated')
+        return bool(quote.get('stale')) or (updated is not None and now - updated > MAX_QUOTE_AGE)
+
+    def get_quote(security_id):
+        return leg_quotes.get(security_id) if security_id else None
+
+    def mid_price(security_id):
+        quote = get_quote(security_id)
+        if not quote or 'error' in quote:
+            return float('nan')
+        if quote['bid_price'] > 0 and quote['ask_price'] > 0:
+            return (quote['bid_price'] + quote['ask_price']) / 2
+        return quote['last_price'] if quote['last_price'] > 0 else float('nan')
+
+    def is_stale(security_id):
+        return is_outdated(get_quote(security_id))
+
+    def is_etf_stale(etf_type):
+        return is_outdated((etf_quotes or {}).get(get_etf_symbol_for_type(etf_type)))
+
+    grid = atm_legs.copy()
+    spot = grid['标的价格']
+    strike = grid['行权价']
+    call_time_value = grid['call_security_id'].map(mid_price) - (spot - strike).clip(lower=0)
+    put_time_value = grid['put_security_id'].map(mid_price) - (strike - spot).clip(lower=0)
+    grid['平值贴水'] = put_time_value - call_time_value
+    grid['贴水率(%)'] = grid['平值贴水'] / spot * 100
+    grid['过期'] = (
+        grid['call_security_id'].map(is_stale)
+        | grid['put_security_id'].map(is_stale)
+        | grid['ETF类型'].map(is_etf_stale)
+    ).astype(bool)
+    return grid
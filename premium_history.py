@@ -0,0 +1,256 @@
+"""
+贴水差值历史存储与降采样
+Premium History Store
+
+每个合约组合按交易日追加写入一个CSV文件，图表读取时在服务端用LTTB算法降采样，
+无论一天内有多少个tick、跨越多少天，发送到浏览器的点数都有上限。
+历史回填（见 premium_backfill.py）得到的每日收盘贴水按组合保存为Parquet列式文件。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from atomic_file import write_atomic
+
+try:
+    import fcntl
+except ImportError:
+    # Windows下没有fcntl，只能保证同一进程内的写入互斥
+    fcntl = None
+
+# 本地数据目录，可通过环境变量 PREMIUM_DATA_DIR 指定
+DATA_DIR = os.environ.get(
+    "PREMIUM_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+)
+TICKS_DIR = os.path.join(DATA_DIR, "premium_ticks")
+DAILY_DIR = os.path.join(DATA_DIR, "premium_daily")
+
+TICK_COLUMNS = ['timestamp', 'diff', 'group1_premium', 'group2_premium', 'strike1', 'strike2']
+DAILY_COLUMNS = ['date', 'etf_close', 'month1', 'strike1', 'month2', 'strike2', 'group1_premium', 'group2_premium', 'diff']
+
+# 图表默认最多显示的点数
+MAX_CHART_POINTS = 1000
+
+# 每个组合同一时间只有一个写入者；写入者超过该时间（秒）未写入时由其他会话接管
+TICK_WRITER_TTL_SECONDS = 30
+
+# 文件读取结果缓存的条目数上限：可容纳若干组合近60日的tick文件，单条为降采样后的结果
+FILE_CACHE_SIZE = 256
+
+_write_lock = threading.Lock()
+# 文件读取结果缓存（LRU）：(path, max_points) -> (mtime, DataFrame)；单日tick文件缓存降采样后的结果
+_file_cache = OrderedDict()
+_file_cache_lock = threading.Lock()
+
+
+def _get_cached(cache_key, mtime):
+    """文件未变化时返回缓存结果并标记为最近使用，否则返回None"""
+    with _file_cache_lock:
+        cached = _file_cache.get(cache_key)
+        if cached is None or cached[0] != mtime:
+            return None
+        _file_cache.move_to_end(cache_key)
+        return cached[1]
+
+
+def _put_cached(cache_key, mtime, frame):
+    """写入缓存，超出上限时淘汰最久未使用的条目"""
+    with _file_cache_lock:
+        _file_cache[cache_key] = (mtime, frame)
+        _file_cache.move_to_end(cache_key)
+        while len(_file_cache) > FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+
+
+def make_pair_key(etf_name, group1, group2):
+    """合约组合的存储键，group为 (月份, 行权价或档位标签如ATM+1, 交易方向)"""
+    parts = [etf_name]
+    for month, strike, direction in (group1, group2):
+        strike_label = f"{strike:g}" if isinstance(strike, (int, float)) else str(strike)
+        parts.append(f"{month}_{strike_label}_{direction}")
+    return re.sub(r"[^0-9A-Za-z_.一-鿿-]", "_", "__".join(parts))
+
+
+def _tick_file(pair_key, date):
+    return os.path.join(TICKS_DIR, pair_key, f"{date.strftime('%Y-%m-%d')}.csv")
+
+
+def _claim_writer(pair_dir, writer_id):
+    """在组合目录的写入者记录中登记writer_id；其他写入者仍在有效期内时返回False"""
+    writer_path = os.path.join(pair_dir, ".writer")
+    now = time.time()
+    try:
+        with open(writer_path, encoding="utf-8") as f:
+            writer = json.load(f)
+        if writer.get('id') != writer_id and now - writer.get('renewed', 0) <= TICK_WRITER_TTL_SECONDS:
+            return False
+    except (OSError, ValueError, AttributeError):
+        pass
+    with open(writer_path, "w", encoding="utf-8") as f:
+        json.dump({'id': writer_id, 'renewed': now}, f)
+    return True
+
+
+def append_tick(pair_key, timestamp, diff, group1_premium, group2_premium, strike1, strike2, writer_id):
+    """追加一条tick，timestamp为带时区的datetime（北京时间），strike为实际使用的行权价。
+
+    多个会话或多个界面进程可能同时观察同一组合，每个组合只由一个写入者（writer_id）记录，
+    避免同一时刻的tick重复写入；其他写入者跳过并返回False。
+    登记写入者和追加数据在组合目录的文件锁内完成，跨进程也不会写出重复的表头。
+    """
+    path = _tick_file(pair_key, timestamp.date())
+    pair_dir = os.path.dirname(path)
+    with _write_lock:
+        os.makedirs(pair_dir, exist_ok=True)
+        with open(os.path.join(pair_dir, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not _claim_writer(pair_dir, writer_id):
+                return False
+            with open(path, "a", encoding="utf-8") as f:
+                if f.tell() == 0:
+                    f.write(",".join(TICK_COLUMNS) + "\n")
+                f.write(
+                    f"{timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')},{diff:.6f},{group1_premium:.6f},"
+                    f"{group2_premium:.6f},{strike1:g},{strike2:g}\n"
+                )
+    return True
+
+
+def _read_tick_file(path, max_points=None):
+    """读取单日tick文件并降采样，文件未变化时直接使用缓存（缓存的是降采样后的结果，内存有上限）"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cache_key = (path, max_points)
+    cached = _get_cached(cache_key, mtime)
+    if cached is not None:
+        return cached
+
+    try:
+        # 按固定列名读取，兼容未记录行权价的旧文件
+        ticks = pd.read_csv(path, names=TICK_COLUMNS, header=0, dtype=str)
+    except (OSError, ValueError, pd.errors.ParserError):
+        return None
+    # 无法解析的行（如旧版本并发写入的重复表头）直接丢弃
+    ticks['timestamp'] = pd.to_datetime(ticks['timestamp'], format='%Y-%m-%d %H:%M:%S.%f', errors='coerce')
+    for column in TICK_COLUMNS[1:]:
+        ticks[column] = pd.to_numeric(ticks[column], errors='coerce')
+    ticks = ticks.dropna(subset=['timestamp', 'diff', 'group1_premium', 'group2_premium']).reset_index(drop=True)
+    if max_points is not None:
+        ticks = downsample_ticks(ticks, max_points)
+        _put_cached(cache_key, mtime, ticks)
+    return ticks
+
+
+def load_ticks(pair_key, dates, max_points_per_day=None):
+    """读取若干交易日的tick，按时间排序；可先对每天单独降采样"""
+    frames = []
+    for date in sorted(dates):
+        ticks = _read_tick_file(_tick_file(pair_key, date), max_points_per_day)
+        if ticks is not None and not ticks.empty:
+            frames.append(ticks)
+
+    if not frames:
+        return pd.DataFrame(columns=TICK_COLUMNS)
+    return pd.concat(frames, ignore_index=True).sort_values('timestamp', ignore_index=True)
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets降采样，返回保留点的下标"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # 下一个桶的平均点，最后一个桶用终点
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # 选取与上一个保留点、下一桶平均点构成三角形面积最大的点
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def downsample_ticks(ticks, max_points=MAX_CHART_POINTS):
+    """按贴水差值序列做LTTB降采样，其余列取相同的点"""
+    if len(ticks) <= max_points:
+        return ticks
+
+    x = ticks['timestamp'].astype('int64').to_numpy(dtype=np.float64)
+    y = ticks['diff'].to_numpy(dtype=np.float64)
+    return ticks.iloc[lttb_indices(x, y, max_points)].reset_index(drop=True)
+
+
+def load_chart_data(pair_key, dates, max_points=MAX_CHART_POINTS):
+    """读取并降采样若干交易日的tick，供图表直接使用：先逐日降采样，再对拼接结果整体降采样"""
+    return downsample_ticks(load_ticks(pair_key, dates, max_points), max_points)
+
+
+def get_chart_dates(calendar, today, num_days):
+    """今天及之前共 num_days 个交易日（今天非交易日时也包含今天的文件）"""
+    previous = calendar.previous_trading_days(today, max(num_days - 1, 0))
+    return [today] + list(previous)
+
+
+def _daily_file(pair_key):
+    return os.path.join(DAILY_DIR, f"{pair_key}.parquet")
+
+
+def write_parquet_atomic(frame, path):
+    """原子写入Parquet文件，读取方不会读到写了一半的文件，需要pyarrow"""
+    write_atomic(path, lambda f: frame.to_parquet(f, index=False), binary=True)
+
+
+def save_daily_premiums(pair_key, daily):
+    """写入某个组合的每日收盘贴水（整体替换），需要pyarrow"""
+    write_parquet_atomic(daily[DAILY_COLUMNS], _daily_file(pair_key))
+
+
+def load_daily_premiums(pair_key):
+    """读取某个组合的每日收盘贴水，文件未变化时直接使用缓存；没有回填数据或未安装pyarrow时返回None"""
+    path = _daily_file(pair_key)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cached = _get_cached((path, None), mtime)
+    if cached is not None:
+        return cached
+
+    try:
+        daily = pd.read_parquet(path)
+    except (OSError, ValueError, ImportError):
+        return None
+    _put_cached((path, None), mtime, daily)
+    return daily
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+行情采集进程
+Quote Collector
+
+独立于界面进程轮询上游行情，并把快照发布到本地总线（见 snapshot_bus.py）。
+可按标的ETF分片启动多个采集进程，每个标的只允许一个采集进程负责，
+从而无论打开多少个界面，每个合约在上游都只有一个轮询者。
+
+示例：
+    python quote_collector.py                               # 负责全部标的
+    python quote_collector.py --underlyings sh510300 sh510050
+    python quote_collector.py --underlyings sh510500 sh588000 sh588080 --interval 2
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from market_data import (
+    ETF_CONFIG,
+    get_option_bid_ask_price,
+    get_real_time_etf_quotes,
+    get_underlying_symbol
+)
+from snapshot_bus import (
+    SUBSCRIPTION_TTL_SECONDS,
+    prune_subscriptions,
+    publish_snapshot,
+    read_snapshots,
+    read_subscriptions
+)
+
+
+def find_conflicting_collectors(collector_name, underlyings):
+    """查找已在运行且负责相同标的的其他采集进程"""
+    conflicts = []
+    for name, snapshot in read_snapshots().items():
+        if name == collector_name:
+            continue
+        overlap = set(snapshot.get('underlyings', [])) & set(underlyings)
+        if overlap:
+            conflicts.append((name, sorted(overlap)))
+    return conflicts
+
+
+def collect_subscribed_legs(underlyings):
+    """汇总所有界面订阅中属于本分片的合约，按security_id去重"""
+    legs = {}
+    for subscription in read_subscriptions().values():
+        for leg in subscription.get('legs', []):
+            if get_underlying_symbol(leg['code']) in underlyings:
+                legs[leg['security_id']] = leg['code']
+    return legs
+
+
+def poll_once(underlyings, executor):
+    """轮询一次本分片的标的价格和所有被订阅的合约报价"""
+    legs = collect_subscribed_legs(underlyings)
+
+    etf_future = executor.submit(get_real_time_etf_quotes, underlyings)
+    quote_futures = {
+        security_id: executor.submit(get_option_bid_ask_price, security_id)
+        for security_id in legs
+    }
+
+    quotes = {}
+    for security_id, future in quote_futures.items():
+        quote = future.result()
+        quote['code'] = legs[security_id]
+        quotes[security_id] = quote
+
+    return {
+        'underlyings': underlyings,
+        'etf_quotes': etf_future.result(),
+        'quotes': quotes
+    }
+
+
+def main():
+    """启动行情采集循环"""
+    parser = argparse.ArgumentParser(description="期权行情采集进程")
+    parser.add_argument("--underlyings", nargs="+", default=list(ETF_CONFIG.keys()),
+                        help="本进程负责的标的ETF行情代码，默认全部")
+    parser.add_argument("--interval", type=float, default=1.0, help="轮询间隔（秒）")
+    parser.add_argument("--name", default=None, help="采集进程名称，默认由标的代码生成")
+    parser.add_argument("--workers", type=int, default=8, help="并行请求线程数")
+    args = parser.parse_args()
+
+    unknown = [symbol for symbol in args.underlyings if symbol not in ETF_CONFIG]
+    if unknown:
+        print(f"错误：未知的标的代码 {', '.join(unknown)}")
+        sys.exit(1)
+
+    underlyings = sorted(set(args.underlyings))
+    collector_name = args.name or "collector_" + "_".join(underlyings)
+
+    conflicts = find_conflicting_collectors(collector_name, underlyings)
+    if conflicts:
+        for name, overlap in conflicts:
+            print(f"错误：采集进程 {name} 已负责 {', '.join(overlap)}")
+        sys.exit(1)
+
+    print(f"🚀 启动行情采集进程 {collector_name}")
+    print(f"📈 负责标的: {', '.join(underlyings)}")
+    print("⏹️  按 Ctrl+C 停止\n")
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            last_pruned = 0.0
+            while True:
+                started = time.time()
+                try:
+                    snapshot = poll_once(underlyings, executor)
+                    publish_snapshot(collector_name, snapshot)
+                except Exception as e:
+                    print(f"❌ 轮询失败: {str(e)}")
+                # 已关闭界面留下的订阅文件每个过期周期清理一次，避免在共享内存中堆积
+                if started - last_pruned > SUBSCRIPTION_TTL_SECONDS:
+                    last_pruned = started
+                    try:
+                        prune_subscriptions()
+                    except OSError as e:
+                        print(f"⚠️ 清理订阅失败: {str(e)}")
+                time.sleep(max(0, args.interval - (time.time() - started)))
+    except KeyboardInterrupt:
+        print("\n👋 采集进程已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+期权基础数据（合约链和代码映射）
+Option Reference Data
+
+合约链和 CONTRACT_ID -> SECURITY_ID 映射每个进程只保留一份只读数据：
+启动时先从本地持久化文件读取，页面可以立即渲染；过期或缺失时在后台线程重新加载，
+没有任何旧数据时按完成顺序逐步发布部分合约链。
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+
+import pandas as pd
+
+from atomic_file import write_atomic, write_json_atomic
+from premium_history import DATA_DIR
+from trading_calendar import get_trading_calendar
+from upstream_client import call_ak
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+CHAIN_FILE = os.path.join(CACHE_DIR, "option_chain.pkl")
+MAPPING_FILE = os.path.join(CACHE_DIR, "option_mapping.json")
+
+# 基础数据有效期（秒）
+REFERENCE_TTL_SECONDS = 43200
+# 加载失败后再次尝试的最短间隔（秒）
+RETRY_SECONDS = 60
+
+OPTION_SYMBOLS = [
+    "华泰柏瑞沪深300ETF期权",      # 300ETF
+    "南方中证500ETF期权",          # 500ETF
+    "华夏上证50ETF期权",           # 50ETF
+    "华夏科创50ETF期权",           # 科创50ETF
+    "易方达科创50ETF期权"          # 科创板50ETF
+]
+
+
+def compact_option_chain(frames):
+    """合并合约链，只保留界面用到的列，并使用紧凑的数据类型；按固定的ETF顺序排列（并行加载的完成顺序不固定）"""
+    chain = pd.concat(frames, ignore_index=True)
+    # 从合约交易代码中提取月份信息
+    chain['合约月份'] = chain['合约交易代码'].str[7:11]
+    chain = chain[['ETF类型', '合约月份', '行权价', '合约交易代码']].astype({
+        'ETF类型': pd.CategoricalDtype(OPTION_SYMBOLS),
+        '合约月份': 'category',
+        '行权价': 'float32'
+    })
+    return chain.sort_values(['ETF类型', '合约月份', '合约交易代码'], ignore_index=True)
+
+
+def load_option_chain(on_progress=None, max_workers=8):
+    """并行获取所有ETF各合约月份的合约链；on_progress(部分合约链) 在每个月份完成后回调"""
+    contract_months = get_trading_calendar().contract_months(datetime.date.today())
+
+    def fetch(symbol, month):
+        board = call_ak('option_finance_board', symbol=symbol, end_month=month).data
+        if board.empty:
+            return None
+        return board.assign(ETF类型=symbol)
+
+    frames = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(fetch, symbol, month)
+            for symbol in OPTION_SYMBOLS
+            for month in contract_months
+        ]
+        for future in as_completed(futures):
+            try:
+                board = future.result()
+            except Exception as e:
+                continue
+            if board is None:
+                continue
+            frames.append(board)
+            if on_progress is not None:
+                on_progress(compact_option_chain(frames))
+
+    if not frames:
+        return pd.DataFrame()
+    return compact_option_chain(frames)
+
+
+def load_option_code_mapping():
+    """建立CONTRACT_ID到SECURITY_ID的映射关系，返回普通dict"""
+    # 获取最近的交易日列表（已排除周末和交易所休市日）
+    working_dates = [
+        d.strftime("%Y%m%d")
+        for d in get_trading_calendar().previous_trading_days(datetime.date.today(), 10)
+    ]
+
+    # 尝试多个交易日，找到一个有效的
+    option_risk_df = None
+    for date in working_dates:
+        try:
+            option_risk_df = call_ak('option_risk_indicator_sse', date=date).data
+            if not option_risk_df.empty:
+                break
+        except Exception as date_error:
+            continue
+
+    if option_risk_df is None or option_risk_df.empty:
+        return {}
+
+    # 检查是否有期望的列名
+    required_columns = ['SECURITY_ID', 'CONTRACT_ID', 'CONTRACT_SYMBOL']
+    if any(col not in option_risk_df.columns for col in required_columns):
+        return {}
+
+    return {
+        str(contract_id): {'security_id': str(security_id), 'contract_symbol': str(contract_symbol)}
+        for contract_id, security_id, contract_symbol in zip(
+            option_risk_df['CONTRACT_ID'],
+            option_risk_df['SECURITY_ID'],
+            option_risk_df['CONTRACT_SYMBOL']
+        )
+    }
+
+
+def freeze_mapping(mapping):
+    """转换为只读映射，供所有会话共享"""
+    return MappingProxyType({
+        contract_id: MappingProxyType(dict(info)) for contract_id, info in mapping.items()
+    })
+
+
+class ReferenceData:
+    """进程内共享的合约链和代码映射，后台加载，读取时只拿引用"""
+
+    def __init__(self, ttl_seconds=REFERENCE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.chain = None
+        self.mapping = MappingProxyType({})
+        self.loaded_at = 0.0
+        self.last_attempt = 0.0
+        self.loading = False
+        # 冷启动时逐步发布的部分合约链
+        self.partial = False
+        self.last_error = None
+        self._load_persisted()
+
+    def _load_persisted(self):
+        """读取上次持久化的数据，使页面可以立即渲染"""
+        if not (os.path.exists(CHAIN_FILE) and os.path.exists(MAPPING_FILE)):
+            return
+        try:
+            chain = pd.read_pickle(CHAIN_FILE)
+            with open(MAPPING_FILE, encoding="utf-8") as f:
+                mapping = json.load(f)
+        except Exception as e:
+            # 文件损坏（如写入中断）时删除，后台加载会重新生成；不能让共享的基础数据因此无法创建
+            self.last_error = f"本地缓存损坏，已删除: {str(e)}"
+            for path in (CHAIN_FILE, MAPPING_FILE):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return
+        if chain.empty or not mapping:
+            return
+        self.chain = chain
+        self.mapping = freeze_mapping(mapping)
+        self.loaded_at = min(os.path.getmtime(CHAIN_FILE), os.path.getmtime(MAPPING_FILE))
+
+    def _persist(self, chain, mapping):
+        # 多个界面进程可能共用数据目录并同时刷新，每个写入者使用各自的临时文件再原子替换
+        try:
+            write_atomic(CHAIN_FILE, chain.to_pickle, binary=True)
+            write_json_atomic(MAPPING_FILE, mapping)
+        except OSError as e:
+            self.last_error = f"持久化失败: {str(e)}"
+
+    def snapshot(self):
+        """当前的 (合约链, 代码映射)，均为只读共享对象"""
+        with self.lock:
+            return self.chain, self.mapping
+
+    def is_expired(self):
+        return time.time() - self.loaded_at > self.ttl_seconds
+
+    def refresh_if_expired(self):
+        """数据缺失或过期时启动后台加载，已在加载中或刚失败过则忽略"""
+        if time.time() - self.last_attempt < RETRY_SECONDS:
+            return
+        if self.chain is None or self.partial or self.is_expired():
+            self.refresh()
+
+    def refresh(self):
+        """启动后台加载线程"""
+        with self.lock:
+            if self.loading:
+                return
+            self.loading = True
+            self.last_attempt = time.time()
+        threading.Thread(target=self._refresh, name="reference-data-loader", daemon=True).start()
+
+    def _publish_partial_chain(self, chain):
+        # 只有在完全没有旧数据时才逐步发布，避免用不完整的新数据替换完整的旧数据
+        with self.lock:
+            if self.chain is None or self.partial:
+                self.chain = chain
+                self.partial = True
+
+    def _refresh(self):
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                mapping_future = executor.submit(load_option_code_mapping)
+                chain = load_option_chain(on_progress=self._publish_partial_chain)
+                mapping = mapping_future.result()
+
+            if chain.empty or not mapping:
+                self.last_error = "期权基础数据获取失败"
+                return
+
+            with self.lock:
+                self.chain = chain
+                self.mapping = freeze_mapping(mapping)
+                self.loaded_at = time.time()
+                self.partial = False
+                self.last_error = None
+            self._persist(chain, mapping)
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            with self.lock:
+                self.loading = False
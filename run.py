@@ -8,6 +8,8 @@ import subprocess
 import sys
 import os
 
+from export_api import EXPORT_HOST, EXPORT_PORT, is_port_available
+
 def main():
     """启动Streamlit应用"""
     try:
@@ -23,6 +25,11 @@ def main():
         print("🚀 启动期权合约选择器...")
         print(f"📁 应用路径: {app_file}")
         print("🌐 应用将在浏览器中自动打开")
+        # 导出接口由应用进程启动，端口被占用时不会启动
+        if is_port_available():
+            print(f"📤 贴水导出接口: http://{EXPORT_HOST}:{EXPORT_PORT}/snapshot")
+        else:
+            print(f"⚠️ 端口 {EXPORT_PORT} 已被占用，贴水导出接口不会启动（可通过环境变量 PREMIUM_EXPORT_PORT 修改）")
         print("⏹️  按 Ctrl+C 停止应用\n")
         
         # 启动Streamlit应用
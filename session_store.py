@@ -0,0 +1,93 @@
+"""
+用户配置与会话状态持久化
+Session Profile Store
+
+每个用户（由网址参数 profile 标识）对应一个JSON文件，保存侧边栏选择、自动刷新状态、
+今日和历史最大贴水差值、贴水差值历史以及最近一次快照。
+浏览器重连或服务重启后先用这些数据立即渲染页面，再获取新的行情。
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+
+from atomic_file import write_text_atomic
+from premium_history import DATA_DIR
+
+PROFILES_DIR = os.path.join(DATA_DIR, "profiles")
+
+# 超过该时间未使用的配置会被清理（秒）
+PROFILE_TTL_SECONDS = 30 * 86400
+
+# 配置标识只允许字母、数字、下划线和连字符，避免拼出任意路径
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+
+def new_profile_id():
+    """生成新的配置标识"""
+    return uuid.uuid4().hex
+
+
+def is_valid_profile_id(profile_id):
+    return isinstance(profile_id, str) and bool(_PROFILE_ID_PATTERN.match(profile_id))
+
+
+def _profile_path(profile_id):
+    return os.path.join(PROFILES_DIR, f"{profile_id}.json")
+
+
+def _to_json_value(obj):
+    # numpy标量等转换为Python原生类型，其余无法序列化的值转为字符串
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def serialize_profile(profile):
+    """配置序列化为JSON文本，用于判断内容是否变化"""
+    return json.dumps(profile, ensure_ascii=False, sort_keys=True, default=_to_json_value)
+
+
+def load_profile(profile_id):
+    """读取配置，不存在或损坏时返回空dict"""
+    if not is_valid_profile_id(profile_id):
+        return {}
+    try:
+        with open(_profile_path(profile_id), encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return profile if isinstance(profile, dict) else {}
+
+
+def save_profile_text(profile_id, profile_text):
+    """原子写入已序列化的配置，成功返回True"""
+    if not is_valid_profile_id(profile_id):
+        return False
+    try:
+        write_text_atomic(_profile_path(profile_id), profile_text)
+    except OSError:
+        return False
+    return True
+
+
+def prune_profiles(max_age_seconds=PROFILE_TTL_SECONDS):
+    """删除长期未使用的配置文件，返回删除数量"""
+    try:
+        names = os.listdir(PROFILES_DIR)
+    except OSError:
+        return 0
+
+    removed = 0
+    now = time.time()
+    for name in names:
+        path = os.path.join(PROFILES_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > max_age_seconds:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
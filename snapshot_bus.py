@@ -0,0 +1,103 @@
+"""
+本地行情快照总线
+Local Snapshot Bus
+
+行情采集进程把最新报价快照写入本机共享目录（优先使用 /dev/shm 内存文件系统），
+任意数量的界面进程从同一目录读取；界面进程通过订阅文件告诉采集进程需要哪些合约。
+所有写入都先写临时文件再原子替换，读取方不会读到半截数据。
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from atomic_file import write_json_atomic
+
+# 订阅超过该时间未刷新视为界面已关闭
+SUBSCRIPTION_TTL_SECONDS = 60
+# 快照超过该时间未更新视为采集进程已停止
+SNAPSHOT_TTL_SECONDS = 30
+
+
+def get_bus_dir():
+    """总线目录，可通过环境变量 PREMIUM_BUS_DIR 指定"""
+    bus_dir = os.environ.get("PREMIUM_BUS_DIR")
+    if not bus_dir:
+        base_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        bus_dir = os.path.join(base_dir, "premium_comparison_bus")
+
+    for sub_dir in ("subscriptions", "snapshots"):
+        os.makedirs(os.path.join(bus_dir, sub_dir), exist_ok=True)
+    return bus_dir
+
+
+def _read_json_files(directory, max_age):
+    """读取目录下未过期的所有json文件"""
+    payloads = {}
+    now = time.time()
+    for file_name in os.listdir(directory):
+        if not file_name.endswith(".json"):
+            continue
+        path = os.path.join(directory, file_name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                continue
+            with open(path, encoding="utf-8") as f:
+                payloads[file_name[:-5]] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return payloads
+
+
+def publish_subscription(subscriber_id, legs):
+    """界面进程登记需要的合约，legs为 [{'code': 合约交易代码, 'security_id': ...}]"""
+    path = os.path.join(get_bus_dir(), "subscriptions", f"{subscriber_id}.json")
+    write_json_atomic(path, {'updated': time.time(), 'legs': legs})
+
+
+def read_subscriptions(max_age=SUBSCRIPTION_TTL_SECONDS):
+    """所有未过期的订阅，返回 {subscriber_id: {'updated', 'legs'}}"""
+    return _read_json_files(os.path.join(get_bus_dir(), "subscriptions"), max_age)
+
+
+def prune_subscriptions(max_age=SUBSCRIPTION_TTL_SECONDS):
+    """删除已过期的订阅文件和写入中断残留的临时文件，返回删除数量"""
+    directory = os.path.join(get_bus_dir(), "subscriptions")
+    removed = 0
+    now = time.time()
+    for file_name in os.listdir(directory):
+        path = os.path.join(directory, file_name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            # 其他采集进程可能已经删除
+            continue
+    return removed
+
+
+def publish_snapshot(collector_name, snapshot):
+    """采集进程发布快照，snapshot包含 underlyings / etf_quotes / quotes"""
+    path = os.path.join(get_bus_dir(), "snapshots", f"{collector_name}.json")
+    snapshot = dict(snapshot, published=time.time(), collector=collector_name, pid=os.getpid())
+    write_json_atomic(path, snapshot)
+
+
+def read_snapshots(max_age=SNAPSHOT_TTL_SECONDS):
+    """所有未过期的采集进程快照，返回 {collector_name: snapshot}"""
+    return _read_json_files(os.path.join(get_bus_dir(), "snapshots"), max_age)
+
+
+def read_merged_snapshot(max_age=SNAPSHOT_TTL_SECONDS):
+    """合并所有分片的快照：ETF价格和期权报价各自合并为一个字典"""
+    merged = {'etf_quotes': {}, 'quotes': {}, 'published': None}
+    for snapshot in read_snapshots(max_age).values():
+        merged['etf_quotes'].update(snapshot.get('etf_quotes', {}))
+        merged['quotes'].update(snapshot.get('quotes', {}))
+        published = snapshot.get('published')
+        if published and (merged['published'] is None or published < merged['published']):
+            # 取最旧的分片时间，反映合并快照的整体新鲜度
+            merged['published'] = published
+    return merged
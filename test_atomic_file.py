@@ -0,0 +1,35 @@
+"""
+原子文件写入测试
+Tests for atomic_file
+"""
+
+import json
+import os
+
+import pytest
+
+from atomic_file import write_atomic, write_json_atomic, write_text_atomic
+
+
+def test_writes_create_directory_and_replace(tmp_path):
+    path = tmp_path / "nested" / "profile.json"
+    write_json_atomic(str(path), {"名称": 1})
+    write_text_atomic(str(path), '{"名称": 2}')
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"名称": 2}
+    assert os.listdir(path.parent) == ["profile.json"]
+
+
+def test_failed_write_keeps_old_file_and_removes_temp(tmp_path):
+    path = tmp_path / "chain.pkl"
+    path.write_bytes(b"old")
+
+    def fail(f):
+        f.write(b"partial")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        write_atomic(str(path), fail, binary=True)
+
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["chain.pkl"]
@@ -0,0 +1,121 @@
+"""
+贴水计算测试
+Tests for premium_calc
+"""
+
+import math
+
+import pandas as pd
+import pytest
+
+from premium_calc import calculate_implied_forwards, resolve_atm_strike, select_atm_legs
+
+
+def make_parity_chain(forwards, discount, strikes, volumes=None):
+    """按 C - P = D·(F - K) 构造满足看涨看跌平价的合约链"""
+    rows = []
+    for month, forward in forwards.items():
+        for strike in strikes:
+            put = 0.2
+            call = put + discount * (forward - strike)
+            volume = 10 if volumes is None else volumes.get((month, strike), 10)
+            rows.append({'合约月份': month, '行权价': strike, '期权类型': 'C', '当前价': call, '数量': volume})
+            rows.append({'合约月份': month, '行权价': strike, '期权类型': 'P', '当前价': put, '数量': volume})
+    return pd.DataFrame(rows)
+
+
+def test_implied_forwards_recover_parity_inputs():
+    chain = make_parity_chain({'2412': 3.95, '2503': 3.90}, 0.99, [3.8, 3.9, 4.0, 4.1])
+    curve = calculate_implied_forwards(chain, 4.0)
+
+    assert list(curve.index) == ['2412', '2503']
+    assert curve.loc['2412', '隐含远期'] == pytest.approx(3.95)
+    assert curve.loc['2503', '隐含远期'] == pytest.approx(3.90)
+    assert curve.loc['2412', '贴现因子'] == pytest.approx(0.99)
+    assert curve.loc['2412', '合成基差'] == pytest.approx(-0.05)
+    assert curve.loc['2503', '基差率'] == pytest.approx(-0.025)
+    assert (curve['有效行权价数'] == 4).all()
+
+
+def test_implied_forwards_skip_untraded_strikes():
+    # 没有成交的行权价带着偏离平价的旧价，不应影响拟合
+    chain = make_parity_chain({'2412': 3.95}, 0.99, [3.8, 3.9, 4.0], volumes={('2412', 4.0): 0})
+    chain.loc[(chain['行权价'] == 4.0) & (chain['期权类型'] == 'C'), '当前价'] = 1.0
+    curve = calculate_implied_forwards(chain, 4.0)
+
+    assert curve.loc['2412', '有效行权价数'] == 2
+    assert curve.loc['2412', '隐含远期'] == pytest.approx(3.95)
+
+
+def test_implied_forwards_need_two_strikes():
+    chain = make_parity_chain({'2412': 3.95}, 0.99, [3.9])
+    assert calculate_implied_forwards(chain, 4.0).empty
+
+
+def test_basis_is_nan_without_underlying_price():
+    chain = make_parity_chain({'2412': 3.95}, 0.99, [3.8, 3.9, 4.0])
+    curve = calculate_implied_forwards(chain, 0.0)
+
+    assert curve.loc['2412', '隐含远期'] == pytest.approx(3.95)
+    assert math.isnan(curve.loc['2412', '合成基差'])
+    assert math.isnan(curve.loc['2412', '基差率'])
+
+
+STRIKES = [3.8, 3.9, 4.0, 4.1, 4.2]
+
+
+def test_atm_strike_is_nearest_strike():
+    assert resolve_atm_strike(STRIKES, 3.96, 0) == 4.0
+    assert resolve_atm_strike(STRIKES, 4.0, 0) == 4.0
+    assert resolve_atm_strike(STRIKES, 4.04, 0) == 4.0
+
+
+def test_atm_strike_tie_picks_lower_strike():
+    # 取可精确表示的价格，避免浮点误差决定归属
+    assert resolve_atm_strike([3.5, 3.75, 4.0], 3.625, 0) == 3.5
+    assert resolve_atm_strike([3.5, 3.75, 4.0], 3.875, 0) == 3.75
+
+
+def test_atm_strike_outside_ladder_uses_nearest_end():
+    assert resolve_atm_strike(STRIKES, 3.0, 0) == 3.8
+    assert resolve_atm_strike(STRIKES, 5.0, 0) == 4.2
+
+
+def test_atm_offsets_step_and_clamp_at_both_ends():
+    assert resolve_atm_strike(STRIKES, 4.0, 1) == 4.1
+    assert resolve_atm_strike(STRIKES, 4.0, -2) == 3.8
+    assert resolve_atm_strike(STRIKES, 4.0, -5) == 3.8
+    assert resolve_atm_strike(STRIKES, 4.0, 5) == 4.2
+    assert resolve_atm_strike(STRIKES, 5.0, 3) == 4.2
+
+
+def test_atm_strike_empty_ladder():
+    assert resolve_atm_strike([], 4.0, 0) is None
+
+
+def test_atm_strike_without_underlying_price_uses_middle_strike():
+    assert resolve_atm_strike(STRIKES, 0.0, 0) == 4.0
+    assert resolve_atm_strike(STRIKES, -1.0, 1) == 4.1
+
+
+def test_atm_legs_skip_dividend_adjusted_contracts():
+    codes = [
+        '510050C2412M02400', '510050P2412M02400',
+        '510050C2412M02500', '510050P2412M02500',
+        # 分红调整合约的行权价更接近现价，但不应被选为平值
+        '510050C2412A02452', '510050P2412A02452'
+    ]
+    option_data = pd.DataFrame({
+        'ETF类型': '华夏上证50ETF期权',
+        '合约月份': '2412',
+        '行权价': [2.4, 2.4, 2.5, 2.5, 2.452, 2.452],
+        '合约交易代码': codes
+    })
+    option_mapping = {code: {'security_id': str(index)} for index, code in enumerate(codes)}
+
+    legs = select_atm_legs(option_data, option_mapping, {'sh510050': 2.46})
+
+    assert len(legs) == 1
+    assert legs.loc[0, '行权价'] == 2.5
+    assert legs.loc[0, 'call_code'] == '510050C2412M02500'
+    assert legs.loc[0, 'put_security_id'] == '3'
@@ -0,0 +1,91 @@
+"""
+贴水差值历史存储测试
+Tests for premium_history
+"""
+
+import numpy as np
+import pandas as pd
+
+import premium_history
+from premium_history import TICK_COLUMNS, downsample_ticks, lttb_indices
+
+
+def make_ticks(count):
+    timestamps = pd.date_range("2025-01-02 09:30", periods=count, freq="s")
+    diff = np.sin(np.arange(count) / 7.0)
+    return pd.DataFrame({
+        'timestamp': timestamps, 'diff': diff, 'group1_premium': diff, 'group2_premium': 0.0,
+        'strike1': 4.0, 'strike2': 4.1
+    })
+
+
+def test_lttb_keeps_endpoints_and_threshold_points():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 13.0) + np.random.default_rng(0).normal(0, 0.1, 1000)
+    indices = lttb_indices(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0
+    assert indices[-1] == 999
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_passes_short_input_through():
+    x = np.arange(50, dtype=np.float64)
+    assert (lttb_indices(x, x, 50) == np.arange(50)).all()
+    assert (lttb_indices(x, x, 80) == np.arange(50)).all()
+
+
+def test_downsample_ticks_keeps_rows_aligned():
+    ticks = make_ticks(500)
+    sampled = downsample_ticks(ticks, 60)
+
+    assert len(sampled) == 60
+    assert sampled['timestamp'].iloc[0] == ticks['timestamp'].iloc[0]
+    assert sampled['timestamp'].iloc[-1] == ticks['timestamp'].iloc[-1]
+    assert sampled['timestamp'].is_monotonic_increasing
+    assert (sampled['diff'] == sampled['group1_premium']).all()
+
+
+def test_downsample_ticks_at_threshold_is_unchanged():
+    ticks = make_ticks(60)
+    assert downsample_ticks(ticks, 60) is ticks
+
+
+def test_tick_file_with_repeated_header_and_bad_rows_loads(tmp_path):
+    path = tmp_path / "2025-01-02.csv"
+    header = ",".join(TICK_COLUMNS)
+    path.write_text(
+        f"{header}\n"
+        "2025-01-02 09:30:00.000000,0.010000,0.020000,0.030000,4,4.1\n"
+        f"{header}\n"
+        "not a time,0.5,0.5,0.5,4,4.1\n"
+        "2025-01-02 09:30:05.000000,0.020000,0.030000,0.040000,4,4.1\n",
+        encoding="utf-8"
+    )
+
+    ticks = premium_history._read_tick_file(str(path))
+
+    assert list(ticks['diff']) == [0.01, 0.02]
+    assert ticks['timestamp'].is_monotonic_increasing
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(premium_history, "FILE_CACHE_SIZE", 2)
+    monkeypatch.setattr(premium_history, "_file_cache", premium_history.OrderedDict())
+    paths = []
+    for day in range(3):
+        path = tmp_path / f"2025-01-0{day + 1}.csv"
+        pd.DataFrame({
+            'timestamp': [f"2025-01-0{day + 1} 10:00:00.000000"],
+            'diff': [0.01], 'group1_premium': [0.02], 'group2_premium': [0.03], 'strike1': [4.0], 'strike2': [4.1]
+        }).to_csv(path, index=False)
+        paths.append(str(path))
+
+    premium_history._read_tick_file(paths[0], 100)
+    premium_history._read_tick_file(paths[1], 100)
+    # 再次读取第一个文件，使第二个文件成为最久未使用
+    premium_history._read_tick_file(paths[0], 100)
+    premium_history._read_tick_file(paths[2], 100)
+
+    assert list(premium_history._file_cache) == [(paths[0], 100), (paths[2], 100)]
@@ -0,0 +1,26 @@
+"""
+期权基础数据测试
+Tests for reference_data
+"""
+
+import json
+
+import reference_data
+from reference_data import ReferenceData
+
+
+def test_corrupt_cache_is_removed_instead_of_raising(tmp_path, monkeypatch):
+    chain_file = tmp_path / "option_chain.pkl"
+    mapping_file = tmp_path / "option_mapping.json"
+    # 写入中断留下的截断pickle
+    chain_file.write_bytes(b"\x80\x04\x95\x10\x00")
+    mapping_file.write_text(json.dumps({"510050C2412M02500": {"security_id": "10007000"}}), encoding="utf-8")
+    monkeypatch.setattr(reference_data, "CHAIN_FILE", str(chain_file))
+    monkeypatch.setattr(reference_data, "MAPPING_FILE", str(mapping_file))
+
+    reference = ReferenceData()
+
+    assert reference.chain is None
+    assert reference.last_error
+    assert not chain_file.exists()
+    assert not mapping_file.exists()
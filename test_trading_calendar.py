@@ -0,0 +1,52 @@
+"""
+交易日历测试
+Tests for trading_calendar
+"""
+
+import datetime
+
+import pytest
+
+from trading_calendar import TradingCalendar, load_holidays
+
+
+def date(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar(2024, 2026, load_holidays())
+
+
+def test_contract_months_keep_current_month_on_expiry_day(calendar):
+    # 2024年12月第四个星期三为12月25日，当天仍以12月为当月合约
+    assert calendar.expiry_date("2412") == date("2024-12-25")
+    assert calendar.contract_months(date("2024-12-25")) == ["2412", "2501", "2503", "2506"]
+
+
+def test_contract_months_roll_to_january_after_december_expiry(calendar):
+    assert calendar.contract_months(date("2024-12-26")) == ["2501", "2502", "2503", "2506"]
+
+
+def test_contract_months_roll_within_year(calendar):
+    # 2025年2月到期日为2月26日，之后本季合约3月同时是当月，顺延到6月和9月
+    assert calendar.contract_months(date("2025-02-26")) == ["2502", "2503", "2506", "2509"]
+    assert calendar.contract_months(date("2025-02-27")) == ["2503", "2504", "2506", "2509"]
+
+
+def test_expiry_on_holiday_moves_to_next_trading_day():
+    # 第四个星期三和星期四休市时顺延到星期五
+    holidays = {date("2025-01-22"), date("2025-01-23")}
+    calendar = TradingCalendar(2025, 2025, holidays)
+    assert calendar.expiry_date("2501") == date("2025-01-24")
+    assert calendar.contract_months(date("2025-01-23")) == ["2501", "2502", "2503", "2506"]
+    assert calendar.contract_months(date("2025-01-27"))[0] == "2502"
+
+
+def test_previous_trading_days_skip_national_day(calendar):
+    assert calendar.previous_trading_days(date("2025-10-09"), 3) == [
+        date("2025-09-30"), date("2025-09-29"), date("2025-09-26")
+    ]
+    assert calendar.previous_trading_day(date("2025-10-08")) == date("2025-09-30")
+    assert calendar.trading_days_between(date("2025-09-30"), date("2025-10-09")) == 2
@@ -0,0 +1,212 @@
+"""
+上游接口调用保护层测试
+Tests for upstream_client
+"""
+
+import pytest
+
+import upstream_client
+from upstream_client import CircuitBreaker, TokenBucket, UpstreamClient, UpstreamError
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic / time.sleep"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(upstream_client.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(upstream_client.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_token_bucket_allows_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+
+    clock.now += 0.5
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+
+
+def test_token_bucket_waits_within_timeout(clock):
+    bucket = TokenBucket(rate=2.0, capacity=1)
+    assert bucket.acquire(timeout=0)
+    started = clock.now
+    assert bucket.acquire(timeout=1.0)
+    assert clock.now - started == pytest.approx(0.5)
+
+
+def test_token_bucket_gives_up_after_timeout(clock):
+    bucket = TokenBucket(rate=1.0, capacity=1)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.5)
+
+
+def test_token_bucket_serves_waiters_in_order(clock):
+    bucket = TokenBucket(rate=4.0, capacity=1)
+    assert bucket.acquire(timeout=0)
+    # 令牌已被预约的等待者排在前面，后来者需要等待更久
+    bucket.tokens -= 1
+    started = clock.now
+    assert bucket.acquire(timeout=1.0)
+    assert clock.now - started == pytest.approx(0.5)
+    assert not bucket.acquire(timeout=0.2)
+
+
+def test_token_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    clock.now += 60
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+
+
+def test_circuit_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_success_resets_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_circuit_breaker_half_open_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, open_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+class FakeAkshare:
+    """按调用次序返回结果或抛出异常的假akshare"""
+
+    def __init__(self):
+        self.fail = False
+        self.value = 1.0
+        self.calls = 0
+
+    def quote(self, symbol):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("down")
+        return self.value
+
+
+@pytest.fixture
+def fake_akshare(monkeypatch):
+    fake = FakeAkshare()
+    monkeypatch.setattr(upstream_client, "get_akshare", lambda: fake)
+    return fake
+
+
+def test_probe_not_sent_does_not_leave_breaker_half_open(clock, fake_akshare, monkeypatch):
+    monkeypatch.setattr(upstream_client, "MAX_RETRIES", 0)
+    client = UpstreamClient()
+    breaker = client._get_breaker("quote")
+    for _ in range(upstream_client.FAILURE_THRESHOLD):
+        breaker.record_failure()
+    clock.now += upstream_client.OPEN_SECONDS
+
+    # 熔断到期时令牌耗尽：试探请求没有发出
+    client.bucket.tokens = 0
+    client.bucket.updated = clock.now
+    monkeypatch.setattr(upstream_client, "ACQUIRE_TIMEOUT", 0)
+    with pytest.raises(UpstreamError):
+        client.call("quote", symbol="a")
+    assert breaker.state == "open"
+
+    # 令牌恢复后，正常的接口应能通过试探请求恢复
+    clock.now += 10
+    response = client.call("quote", symbol="a")
+    assert response.data == 1.0
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_rejects_without_taking_a_token(clock, fake_akshare):
+    client = UpstreamClient()
+    breaker = client._get_breaker("quote")
+    for _ in range(upstream_client.FAILURE_THRESHOLD):
+        breaker.record_failure()
+    client.bucket.tokens = 0
+    client.bucket.updated = clock.now
+
+    started = clock.now
+    with pytest.raises(UpstreamError):
+        client.call("quote", symbol="a")
+    assert clock.now == started
+    assert client.bucket.tokens == 0
+    assert fake_akshare.calls == 0
+
+
+def test_invalid_data_is_not_an_endpoint_failure(clock, fake_akshare):
+    client = UpstreamClient()
+    fake_akshare.value = 0.0
+
+    response = client.call("quote", validate=lambda value: value > 0, symbol="illiquid")
+    assert response.data == 0.0
+    assert not response.stale
+    assert fake_akshare.calls == 1
+    assert client.status()["quote"] == {"state": "closed", "failures": 0}
+
+
+def test_invalid_data_falls_back_to_last_valid_result(clock, fake_akshare):
+    client = UpstreamClient()
+    client.call("quote", validate=lambda value: value > 0, symbol="a")
+
+    fake_akshare.value = 0.0
+    response = client.call("quote", validate=lambda value: value > 0, symbol="a")
+    assert response.data == 1.0
+    assert response.stale
+
+
+def test_failures_fall_back_then_raise(clock, fake_akshare, monkeypatch):
+    monkeypatch.setattr(upstream_client, "MAX_RETRIES", 0)
+    client = UpstreamClient()
+    client.call("quote", symbol="a")
+
+    fake_akshare.fail = True
+    assert client.call("quote", symbol="a").stale
+    with pytest.raises(UpstreamError):
+        client.call("quote", symbol="b")
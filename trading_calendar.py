@@ -0,0 +1,199 @@
+"""
+交易日历服务
+Trading Calendar Service
+
+启动时一次性预计算多年的交易日、上一交易日和期权到期日表，
+节假日从本地 holidays.txt 加载，之后所有查询都是字典/列表的O(1)查找。
+"""
+
+import datetime
+import os
+from functools import lru_cache
+
+HOLIDAY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "holidays.txt")
+
+# 预计算覆盖的年份范围（相对今年）
+YEARS_BEFORE = 3
+YEARS_AFTER = 2
+
+QUARTER_MONTHS = [3, 6, 9, 12]
+
+
+def load_holidays(path=HOLIDAY_FILE):
+    """从本地文件加载休市日，每行一个 YYYY-MM-DD，# 之后为注释"""
+    holidays = set()
+    if not os.path.exists(path):
+        return holidays
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                holidays.add(datetime.datetime.strptime(line, "%Y-%m-%d").date())
+            except ValueError:
+                continue
+
+    return holidays
+
+
+def _next_month(year, month):
+    """返回下一个自然月的 (年, 月)"""
+    if month == 12:
+        return year + 1, 1
+    return year, month + 1
+
+
+def _month_code(year, month):
+    """合约月份代码，如 2412"""
+    return f"{year % 100:02d}{month:02d}"
+
+
+class TradingCalendar:
+    """预计算的交易日历和期权到期日表"""
+
+    def __init__(self, start_year, end_year, holidays=None):
+        self.start_date = datetime.date(start_year, 1, 1)
+        self.end_date = datetime.date(end_year, 12, 31)
+        self.holidays = set(holidays or ())
+
+        # 交易日列表及其下标
+        self.trading_days = []
+        self._trading_index = {}
+        # 每个自然日 -> 严格早于它的上一交易日 / 不早于它的第一个交易日下标
+        self._previous_trading_day = {}
+        self._next_trading_index = {}
+
+        current = self.start_date
+        one_day = datetime.timedelta(days=1)
+        while current <= self.end_date:
+            self._previous_trading_day[current] = self.trading_days[-1] if self.trading_days else None
+            if current.weekday() < 5 and current not in self.holidays:
+                self._trading_index[current] = len(self.trading_days)
+                self.trading_days.append(current)
+            current += one_day
+
+        # 反向填充"不早于当天的第一个交易日"
+        next_index = None
+        current = self.end_date
+        while current >= self.start_date:
+            if current in self._trading_index:
+                next_index = self._trading_index[current]
+            self._next_trading_index[current] = next_index
+            current -= one_day
+
+        # 到期日表：到期月份第四个星期三，遇休市顺延至下一交易日
+        self._expiry_dates = {}
+        for year in range(start_year, end_year + 1):
+            for month in range(1, 13):
+                first_day = datetime.date(year, month, 1)
+                first_wednesday = first_day + datetime.timedelta(days=(2 - first_day.weekday()) % 7)
+                fourth_wednesday = first_wednesday + datetime.timedelta(weeks=3)
+                index = self._next_trading_index.get(fourth_wednesday)
+                self._expiry_dates[_month_code(year, month)] = (
+                    self.trading_days[index] if index is not None else fourth_wednesday
+                )
+
+        self._contract_months = {}
+
+    def missing_holiday_years(self, today=None):
+        """今年和明年中 holidays.txt 没有任何休市日的年份，这些年份只排除周末，交易日和到期日可能不准"""
+        today = today or datetime.date.today()
+        covered_years = {holiday.year for holiday in self.holidays}
+        return [year for year in (today.year, today.year + 1) if year not in covered_years]
+
+    def is_trading_day(self, date):
+        """是否为交易日"""
+        return date in self._trading_index
+
+    def previous_trading_day(self, date):
+        """严格早于 date 的上一交易日"""
+        return self._previous_trading_day.get(date)
+
+    def previous_trading_days(self, date, num_days):
+        """严格早于 date 的最近 num_days 个交易日，按日期倒序"""
+        previous = self._previous_trading_day.get(date)
+        if previous is None:
+            return []
+        end = self._trading_index[previous] + 1
+        return self.trading_days[max(end - num_days, 0):end][::-1]
+
+    def expiry_date(self, contract_month):
+        """合约月份代码（如 2412）对应的到期日"""
+        return self._expiry_dates.get(contract_month)
+
+    def trading_days_between(self, start, end):
+        """从 start（含，非交易日则取其后第一个交易日）到 end（含）之间的交易日数"""
+        start_index = self._next_trading_index.get(start)
+        end_index = self._trading_index.get(end)
+        if start_index is None or end_index is None:
+            return None
+        return max(end_index - start_index + 1, 0)
+
+    def time_to_expiry(self, contract_month, today=None):
+        """距离到期的自然日、交易日和年化时间"""
+        today = today or datetime.date.today()
+        expiry = self.expiry_date(contract_month)
+        if expiry is None:
+            return None
+
+        calendar_days = (expiry - today).days
+        return {
+            'expiry_date': expiry,
+            'calendar_days': calendar_days,
+            'trading_days': self.trading_days_between(today, expiry),
+            'years': max(calendar_days, 0) / 365.0
+        }
+
+    def contract_months(self, today=None):
+        """当月、下月、本季、下季四个合约月份代码"""
+        today = today or datetime.date.today()
+        if today in self._contract_months:
+            return self._contract_months[today]
+
+        # 今天在本月到期日及之前则以本月为基准，否则以下月为基准
+        base_year, base_month = today.year, today.month
+        if today > self.expiry_date(_month_code(base_year, base_month)):
+            base_year, base_month = _next_month(base_year, base_month)
+
+        current_month = _month_code(base_year, base_month)
+        next_year, next_month = _next_month(base_year, base_month)
+        next_month_contract = _month_code(next_year, next_month)
+
+        # 本季合约（3、6、9、12月），不能与当月或下月重复
+        quarter_year = base_year
+        quarter_month = next((qm for qm in QUARTER_MONTHS if base_month <= qm), None)
+        if quarter_month is None:
+            quarter_year, quarter_month = base_year + 1, 3
+        while _month_code(quarter_year, quarter_month) in (current_month, next_month_contract):
+            quarter_year, quarter_month = _next_quarter(quarter_year, quarter_month)
+
+        next_quarter_year, next_quarter_month = _next_quarter(quarter_year, quarter_month)
+
+        months = [
+            current_month,
+            next_month_contract,
+            _month_code(quarter_year, quarter_month),
+            _month_code(next_quarter_year, next_quarter_month)
+        ]
+        self._contract_months[today] = months
+        return months
+
+
+def _next_quarter(year, month):
+    """返回下一个季月的 (年, 月)"""
+    if month == 12:
+        return year + 1, 3
+    return year, QUARTER_MONTHS[QUARTER_MONTHS.index(month) + 1]
+
+
+@lru_cache(maxsize=4)
+def _build_calendar(year):
+    return TradingCalendar(year - YEARS_BEFORE, year + YEARS_AFTER, load_holidays())
+
+
+def get_trading_calendar(today=None):
+    """获取覆盖今天前后数年的交易日历（进程内缓存，跨年自动重建）"""
+    today = today or datetime.date.today()
+    return _build_calendar(today.year)
@@ -0,0 +1,226 @@
+"""
+上游接口调用保护层
+Upstream Resilience Layer
+
+所有 akshare 接口调用都经过同一个客户端：
+- 令牌桶限速，避免并发线程把上游打到限流
+- 指数退避 + 随机抖动重试
+- 按接口独立的熔断器，连续失败后暂停调用一段时间
+- 失败或熔断期间返回最近一次成功结果（标记为过期），过期太久则抛出 UpstreamError
+
+akshare 依赖树很大，只在第一次真正调用时导入（或由 warm_up 在后台线程提前导入），
+不拖慢页面进程的启动。
+"""
+
+import random
+import threading
+import time
+from collections import namedtuple
+
+# 限速：每秒补充的令牌数和桶容量
+RATE_PER_SECOND = 8.0
+BURST = 16
+# 等待令牌的最长时间（秒），超时视为本次调用失败
+ACQUIRE_TIMEOUT = 2.0
+
+# 重试：最多额外重试次数，退避基数和上限（秒）
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 2.0
+
+# 熔断：连续失败次数阈值和熔断持续时间（秒）
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 30.0
+
+# 失败时允许返回的最近成功结果的最长年龄（秒）
+MAX_STALE_SECONDS = 300.0
+
+# data: 接口返回值；fetched_at: 该数据的获取时间；stale: 是否为回退的旧数据
+UpstreamResponse = namedtuple("UpstreamResponse", ["data", "fetched_at", "stale"])
+
+
+_akshare = None
+_akshare_lock = threading.Lock()
+
+
+def get_akshare():
+    """按需导入akshare，只导入一次"""
+    global _akshare
+    if _akshare is None:
+        with _akshare_lock:
+            if _akshare is None:
+                import akshare
+                _akshare = akshare
+    return _akshare
+
+
+def warm_up():
+    """在后台线程提前导入akshare，不阻塞调用方"""
+    threading.Thread(target=get_akshare, name="akshare-import", daemon=True).start()
+
+
+class UpstreamError(Exception):
+    """上游不可用且没有可回退的数据"""
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """取一个令牌，timeout内取不到返回False。
+
+        令牌不足时预约下一个可用令牌（令牌数可为负）再等待，按请求先后依次放行，
+        不会出现某个线程反复抢不到令牌而等待超时。
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                return False
+            self.tokens -= 1
+
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    """单个接口的熔断器：closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold, open_seconds):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """当前是否允许发起调用；熔断到期后只放行一个试探请求"""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = "half_open"
+                return True
+            return False
+
+    def rejecting(self):
+        """不改变状态地判断当前是否一定会拒绝调用：熔断中且未到试探时间，或试探请求正在进行"""
+        with self.lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.open_seconds
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """带限速、重试、熔断和旧数据回退的akshare调用客户端"""
+
+    def __init__(self):
+        self.bucket = TokenBucket(RATE_PER_SECOND, BURST)
+        self.breakers = {}
+        self.last_good = {}
+        self.lock = threading.Lock()
+
+    def _get_breaker(self, endpoint):
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(FAILURE_THRESHOLD, OPEN_SECONDS)
+            return self.breakers[endpoint]
+
+    def _fallback(self, cache_key, reason):
+        """返回最近一次成功结果，没有或太旧则抛出异常"""
+        with self.lock:
+            cached = self.last_good.get(cache_key)
+        if cached is not None and time.time() - cached.fetched_at <= MAX_STALE_SECONDS:
+            return UpstreamResponse(cached.data, cached.fetched_at, True)
+        raise UpstreamError(reason)
+
+    def call(self, endpoint, validate=None, **kwargs):
+        """调用 ak.<endpoint>(**kwargs)
+
+        validate(data) 返回False表示接口正常但该参数暂无可用数据（如无成交无报价的合约）：
+        不计入熔断、不重试，有最近一次有效结果时回退到它，否则原样返回。
+        """
+        cache_key = (endpoint, tuple(sorted(kwargs.items())))
+        breaker = self._get_breaker(endpoint)
+
+        last_error = None
+        for attempt in range(MAX_RETRIES + 1):
+            # 一定会被熔断拒绝的调用直接回退，不占用共享令牌也不等待
+            if breaker.rejecting():
+                return self._fallback(cache_key, f"{endpoint} 熔断中")
+            # 可能发出的调用先取令牌再调用allow()：熔断到期后放行的试探请求必须真正发出，
+            # 否则熔断器会停留在half_open，之后的调用全部被拒绝
+            if not self.bucket.acquire(timeout=ACQUIRE_TIMEOUT):
+                return self._fallback(cache_key, f"{endpoint} 限速等待超时")
+            if not breaker.allow():
+                return self._fallback(cache_key, f"{endpoint} 熔断中")
+
+            try:
+                data = getattr(get_akshare(), endpoint)(**kwargs)
+            except Exception as e:
+                last_error = e
+                breaker.record_failure()
+                if attempt < MAX_RETRIES:
+                    # 全抖动指数退避
+                    time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+                continue
+
+            breaker.record_success()
+            response = UpstreamResponse(data, time.time(), False)
+            if validate is not None and not validate(data):
+                try:
+                    return self._fallback(cache_key, "暂无有效数据")
+                except UpstreamError:
+                    return response
+            with self.lock:
+                self.last_good[cache_key] = response
+            return response
+
+        return self._fallback(cache_key, f"{endpoint} 调用失败: {str(last_error)}")
+
+    def status(self):
+        """各接口熔断器状态，供界面展示"""
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {
+            endpoint: {'state': breaker.state, 'failures': breaker.failures}
+            for endpoint, breaker in breakers.items()
+        }
+
+
+_client = UpstreamClient()
+
+
+def get_upstream_client():
+    """进程内共享的上游客户端"""
+    return _client
+
+
+def call_ak(endpoint, validate=None, **kwargs):
+    """通过共享客户端调用akshare接口，返回 UpstreamResponse"""
+    return _client.call(endpoint, validate=validate, **kwargs)